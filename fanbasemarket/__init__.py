@@ -9,7 +9,7 @@ from datetime import datetime, timedelta
 from flask_cors import CORS
 from string import capwords
 from flask import Flask, g
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO
 from flask_apscheduler import APScheduler
 from os import getenv
 from warnings import filterwarnings
@@ -42,6 +42,12 @@ app.config['JWT_BLACKLIST_TOKEN_CHECKS'] = ['access', 'refresh']
 app.config['JWT_COOKIE_CSRF_PROTECT'] = True
 app.config['JWT_SESSION_COOKIE'] = False
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['ORDER_BATCH_WINDOW'] = float(getenv('ORDER_BATCH_WINDOW', '0.05'))
+app.config['ORDER_FILL_TIMEOUT'] = float(getenv('ORDER_FILL_TIMEOUT', '30'))
+app.config['BROADCAST_INTERVAL'] = float(getenv('BROADCAST_INTERVAL', '1.0'))
+app.config['COMPRESS_MIN_SIZE'] = int(getenv('COMPRESS_MIN_SIZE', '1024'))
+app.config['SCOREBOARD_REPLAY'] = getenv('SCOREBOARD_REPLAY')
+app.config['SCOREBOARD_REPLAY_SPEED'] = float(getenv('SCOREBOARD_REPLAY_SPEED', '100'))
 
 
 db = SQLAlchemy(app)
@@ -66,23 +72,33 @@ def teardown_db(exc):
 from fanbasemarket.routes.auth import auth
 from fanbasemarket.routes.users import users
 from fanbasemarket.routes.teams import teams
+from fanbasemarket.routes.utils import compress
 
 app.register_blueprint(auth, url_prefix='/api/auth/')
 app.register_blueprint(users, url_prefix='/api/users/')
 app.register_blueprint(teams, url_prefix='/api/teams/')
+app.after_request(compress)
 
 scheduler = APScheduler()
 
-from fanbasemarket.pricing.live import bigboy_pulls_only
+from fanbasemarket.pricing.live import bigboy_pulls_only, use_source
+from fanbasemarket.pricing.scoreboard import ReplaySource
+from fanbasemarket.pricing import broadcast, compact
+from fanbasemarket.queries import snapshot
 
 @scheduler.task('interval', seconds=30)
 def pull_and_emit():
     with app.app_context():
         db = get_db()
-        results = bigboy_pulls_only(db)
-        emit('prices', results, broadcast=True, namespace='/')
+        # new prices reach clients through the broadcast stage
+        bigboy_pulls_only(db)
+        snapshot.refresh(db)
 
 def create_app():
+    if app.config['SCOREBOARD_REPLAY']:
+        use_source(ReplaySource.load(app.config['SCOREBOARD_REPLAY'],
+                                     speed=app.config['SCOREBOARD_REPLAY_SPEED']))
     scheduler.init_app(app)
     scheduler.start()
+    io.start_background_task(broadcast.run, app.config['BROADCAST_INTERVAL'])
     return app
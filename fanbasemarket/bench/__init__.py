@@ -0,0 +1,39 @@
+'''Shared setup for the bench scripts.
+
+The app's engine is bound to the .env database as soon as fanbasemarket is
+imported, so assigning SQLALCHEMY_DATABASE_URI afterwards changes nothing.
+Scripts that write to a database run inside scratch_app(url) instead.
+'''
+from flask import Flask
+from sqlalchemy.engine import make_url
+
+from fanbasemarket import app, db
+
+# a non-sqlite database must say it is disposable in its name
+SCRATCH_MARKERS = ('scratch', 'bench')
+
+def is_scratch(url):
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return True
+    return any(marker in (url.database or '').lower() for marker in SCRATCH_MARKERS)
+
+def scratch_app(url):
+    '''a Flask app with the app's config and extensions whose engine is bound to url
+
+    Exits unless url is a scratch database (sqlite, or a name containing one
+    of SCRATCH_MARKERS) other than the app's own.
+    '''
+    own = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if not is_scratch(url) or make_url(url) == own:
+        raise SystemExit(f'refusing to write to {make_url(url)!r}: use sqlite or a '
+                         f'database whose name contains one of {SCRATCH_MARKERS}')
+    bench = Flask(app.import_name)
+    bench.config.from_mapping(app.config)
+    bench.config['SQLALCHEMY_DATABASE_URI'] = url
+    if make_url(url).get_backend_name() == 'sqlite':
+        bench.config.pop('SQLALCHEMY_POOL_SIZE', None)
+    # socketio, jwt, executor...: everything but the engine is shared
+    bench.extensions.update({k: v for k, v in app.extensions.items() if k != 'sqlalchemy'})
+    db.init_app(bench)
+    return bench
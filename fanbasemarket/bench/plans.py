@@ -0,0 +1,174 @@
+'''Query-plan regression check for the hot filters.
+
+Seeds a synthetic market into a scratch database, runs the app's own query
+functions against it, and EXPLAINs every SELECT they issue. Fails unless the
+statements of each call are planned onto the indexes listed in hot_calls().
+
+    python -m fanbasemarket.bench.plans                      # in-memory SQLite
+    python -m fanbasemarket.bench.plans --url mysql://u:p@host/scratch_db
+
+Every table in --url is dropped first, so it must be a scratch database
+(see bench.scratch_app); the app's own database is never touched.
+
+This is a manual check, not part of an automated suite: the repo has no test
+runner, and none was added for it. It exits non-zero when a plan regresses,
+so CI can run it as a step.
+'''
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from random import Random
+from sqlalchemy import event, text
+
+from fanbasemarket import db
+from fanbasemarket.bench import scratch_app
+from fanbasemarket.models import User, Team, Purchase, PurchaseTransaction, \
+                                 Teamcandle, Teamprice, Sale, Short, \
+                                 ShortTransaction, Unshort, Portfoliosnapshot
+from fanbasemarket.pricing.live import order_flow, pregame_elo
+from fanbasemarket.queries import leaderboard
+from fanbasemarket.queries.candle import fold_candles
+from fanbasemarket.queries.team import EST, get_all_team_data
+from fanbasemarket.queries.user import fill_sell, fill_unshort, load_milestones, \
+                                       generate_user_graph
+
+SEASON_START = datetime(2019, 10, 22)
+LIVE_START = datetime(2020, 8, 17, 19)
+LIVE_NOW = datetime(2020, 8, 17, 21)
+
+def seed(scale, rng):
+    n_users = 2000 * scale
+    n_lots = 50000 * scale
+    n_ticks = 100000 * scale
+    n_teams = 30
+
+    def when(i, n):
+        return SEASON_START + timedelta(minutes=int(300 * 24 * 60 * i / n))
+
+    with db.engine.begin() as conn:
+        conn.execute(Team.__table__.insert(), [
+            {'id': t, 'name': f'Team {t}', 'abr': f'T{t}', 'price': 1500.0,
+             'prev_price': 1500.0, 'delta': 0.0}
+            for t in range(1, n_teams + 1)])
+        conn.execute(User.__table__.insert(), [
+            {'id': u, 'username': f'user{u}', 'email': f'user{u}@example.com',
+             'available_funds': 50000.0}
+            for u in range(1, n_users + 1)])
+        ticks = [(rng.randint(1, n_teams), when(i, n_ticks), rng.uniform(1000, 1800))
+                 for i in range(n_ticks)]
+        conn.execute(Teamprice.__table__.insert(), [
+            {'team_id': t, 'date': d, 'elo': p} for t, d, p in ticks])
+        conn.execute(Teamcandle.__table__.insert(), fold_candles(ticks))
+        trades = lambda: [(rng.randint(1, n_users), rng.randint(1, n_teams),
+                           when(i, n_lots)) for i in range(n_lots)]
+        conn.execute(Purchase.__table__.insert(), [
+            {'user_id': u, 'team_id': t, 'purchased_at': d, 'exists': rng.random() < .6,
+             'purchased_for': 1500.0, 'amt_shares': rng.randint(1, 20)}
+            for u, t, d in trades()])
+        conn.execute(PurchaseTransaction.__table__.insert(), [
+            {'user_id': u, 'team_id': t, 'date': d, 'purchased_for': 1500.0,
+             'amt_purchased': 1} for u, t, d in trades()])
+        conn.execute(Sale.__table__.insert(), [
+            {'user_id': u, 'team_id': t, 'date': d, 'sold_for': 1500.0,
+             'amt_sold': 1} for u, t, d in trades()])
+        conn.execute(Short.__table__.insert(), [
+            {'user_id': u, 'team_id': t, 'shorted_at': d, 'exists': rng.random() < .6,
+             'shorted_for': 1500.0, 'amt_shorted': 1} for u, t, d in trades()])
+        conn.execute(ShortTransaction.__table__.insert(), [
+            {'user_id': u, 'team_id': t, 'shorted_at': d, 'shorted_for': 1500.0,
+             'amt_shorted': 1} for u, t, d in trades()])
+        conn.execute(Unshort.__table__.insert(), [
+            {'user_id': u, 'team_id': t, 'unshorted_at': d, 'unshorted_for': 1500.0,
+             'amt_unshorted': 1} for u, t, d in trades()])
+        conn.execute(Portfoliosnapshot.__table__.insert(), [
+            {'user_id': u, 'date': d, 'value': 50000.0} for u, _, d in trades()])
+        conn.execute(text('ANALYZE' if db.engine.dialect.name == 'sqlite' else \
+            'ANALYZE TABLE purchase, purchasetransaction, teamprice, teamcandle, '
+            'sale, short, shorttransaction, unshort, portfoliosnapshot'))
+
+def rolled_back(fn):
+    '''runs a fill for its reads only'''
+    def run():
+        try:
+            fn()
+        except ValueError:
+            pass
+        db.session.rollback()
+    return run
+
+def hot_calls():
+    '''(name, call, indexes its statements must use) for every hot path'''
+    start, now = EST.localize(LIVE_START), EST.localize(LIVE_NOW)
+    team = db.session.get(Team, 3)
+    return [
+        ('live order flow', lambda: order_flow({3: start, 5: start}, now, db),
+         ['ix_purchase_team_purchased_at', 'ix_sale_team_date',
+          'ix_shorttransaction_team_shorted_at', 'ix_unshort_team_unshorted_at']),
+        ('pregame elo', lambda: pregame_elo(3, start, db),
+         ['ix_teamprice_team_date']),
+        ('sell lots', rolled_back(lambda: fill_sell(7, team, 1500.0, 1, now, db)),
+         ['ix_purchase_user_team_exists']),
+        ('unshort lots', rolled_back(lambda: fill_unshort(7, team, 1500.0, 1, now, db)),
+         ['ix_short_user_team_exists']),
+        ('leaderboard holdings', lambda: leaderboard.load(db),
+         ['ix_purchase_user_team_exists']),
+        ('graph milestones', lambda: load_milestones(7, LIVE_START, db),
+         ['ix_sale_user_date', 'ix_purchasetransaction_user_date',
+          'ix_shorttransaction_user_shorted_at', 'ix_unshort_user_unshorted_at']),
+        ('portfolio graph', lambda: generate_user_graph(7, db),
+         ['ix_portfoliosnapshot_user_date']),
+        ('team candles', lambda: get_all_team_data(db),
+         ['ix_teamcandle_resolution_bucket']),
+    ]
+
+@contextmanager
+def captured(engine):
+    '''collects (statement, parameters) of every SELECT run on engine'''
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+def used_indexes(conn, statement, parameters):
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        return ' '.join(str(row[-1]) for row in rows)
+    result = conn.exec_driver_sql('EXPLAIN ' + statement, parameters)
+    keys = list(result.keys())
+    return ' '.join(str(dict(zip(keys, row)).get('key')) for row in result)
+
+def main():
+    ap = ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--url', default='sqlite://')
+    ap.add_argument('--scale', type=int, default=1)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    bench = scratch_app(args.url)
+    with bench.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.scale, Random(args.seed))
+        failures = 0
+        for name, call, indexes in hot_calls():
+            with captured(db.engine) as statements:
+                call()
+            db.session.commit()
+            conn = db.session.connection()
+            plan = ' '.join(used_indexes(conn, s, p) for s, p in statements)
+            db.session.commit()
+            for index in indexes:
+                ok = index in plan
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'} {name:<22} {index}")
+        db.session.remove()
+    if failures:
+        raise SystemExit(f'{failures} hot queries are not using their index')
+
+if __name__ == '__main__':
+    main()
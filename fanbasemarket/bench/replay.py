@@ -0,0 +1,115 @@
+'''Offline replay of a recorded scoreboard night through the live pricing job.
+
+Record a night from the live feed (one frame per changed scoreboard):
+
+    python -m fanbasemarket.bench.replay record night.jsonl --hours 6
+
+then replay it against a scratch database and time every tick:
+
+    python -m fanbasemarket.bench.replay run night.jsonl --url sqlite:///replay.db
+
+run seeds every team at 1500 the day before the first frame, dropping every
+table in --url first; pass --no-seed to replay against a copy of a loaded
+market instead. Either way --url must be a scratch database (see
+bench.scratch_app); the app's own database is never touched.
+
+With --speed 0 (the default) ticks run back to back on a simulated clock,
+one --interval of replayed time apart; otherwise they are paced in real
+time at that speed-up, as the app does with SCOREBOARD_REPLAY_SPEED.
+'''
+from argparse import ArgumentParser
+from datetime import timedelta
+from json import dumps
+from statistics import mean
+from time import monotonic, perf_counter, sleep
+from nba_api.stats.static import teams
+
+from fanbasemarket import db
+from fanbasemarket.bench import scratch_app
+from fanbasemarket.models import Team, Teamprice
+from fanbasemarket.pricing import ticker
+from fanbasemarket.pricing.live import bigboy_pulls_only, use_source
+from fanbasemarket.pricing.scoreboard import ReplaySource, ScoreboardClient
+
+def record(args):
+    client = ScoreboardClient()
+    stop = monotonic() + args.hours * 3600
+    frames = 0
+    with open(args.recording, 'a') as f:
+        while monotonic() < stop:
+            now = client.now()
+            games = client.fetch(now)
+            if games is not None:
+                f.write(dumps({'at': now.isoformat(), 'scoreboard': {'games': games}}) + '\n')
+                f.flush()
+                frames += 1
+                print(f'{now:%H:%M:%S} frame {frames}: {len(games)} games')
+            sleep(args.interval)
+
+def seed(start):
+    db.drop_all()
+    db.create_all()
+    day_before = start.replace(tzinfo=None) - timedelta(days=1)
+    for team in teams.get_teams():
+        t = Team(name=team['full_name'], abr=team['abbreviation'],
+                 price=1500.0, prev_price=1500.0, delta=0.0)
+        db.session.add(t)
+        db.session.flush()
+        db.session.add(Teamprice(team_id=t.id, date=day_before, elo=1500.0))
+    db.session.commit()
+
+def percentile(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+def run(args):
+    bench = scratch_app(args.url)
+    if args.speed > 0:
+        clock, advance = monotonic, lambda: sleep(args.interval / args.speed)
+    else:
+        t = [0.0]
+        clock = lambda: t[0]
+        def advance():
+            t[0] += args.interval
+    source = ReplaySource.load(args.recording, speed=args.speed or 1, clock=clock)
+    use_source(source)
+
+    with bench.app_context():
+        if not args.no_seed:
+            seed(source.times[0])
+        ticker.invalidate()
+        durations = []
+        priced = 0
+        while not source.finished:
+            start = perf_counter()
+            priced += bool(bigboy_pulls_only(db))
+            durations.append(perf_counter() - start)
+            advance()
+        db.session.remove()
+
+    ms = [d * 1000 for d in durations]
+    print(f'{len(ms)} ticks ({priced} priced) over {len(source.times)} frames')
+    print(f'tick ms: mean {mean(ms):.1f}  p50 {percentile(ms, .5):.1f}  '
+          f'p95 {percentile(ms, .95):.1f}  max {max(ms):.1f}')
+
+def main():
+    ap = ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record')
+    rec.add_argument('recording')
+    rec.add_argument('--hours', type=float, default=6)
+    rec.add_argument('--interval', type=float, default=30)
+    rec.set_defaults(fn=record)
+    rep = sub.add_parser('run')
+    rep.add_argument('recording')
+    rep.add_argument('--url', default='sqlite:///replay.db')
+    rep.add_argument('--interval', type=float, default=30,
+                     help='replayed seconds between scheduler pulls')
+    rep.add_argument('--speed', type=float, default=0)
+    rep.add_argument('--no-seed', action='store_true')
+    rep.set_defaults(fn=run)
+    args = ap.parse_args()
+    args.fn(args)
+
+if __name__ == '__main__':
+    main()
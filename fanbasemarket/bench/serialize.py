@@ -0,0 +1,95 @@
+'''Response serialization benchmark.
+
+Builds synthetic allTeamData, leaderboard and usrPg payloads shaped like
+the real ones, then compares stdlib json.dumps with encoding.encode()
+and the chunked iter_encode() on build time and peak traced memory.
+
+    python -m fanbasemarket.bench.serialize --users 20000 --repeat 5
+
+Nothing connects to a database, but importing the fanbasemarket package
+still sets up the app and its engine, so the app's requirements and .env
+must be in place.
+'''
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from json import dumps
+from random import Random
+from time import perf_counter
+import tracemalloc
+
+from fanbasemarket.queries.team import GRAPH_WINDOWS
+from fanbasemarket.encoding import encode, iter_encode
+
+NOW = datetime(2020, 8, 17, 21, 0)
+STEPS = {'minute': timedelta(minutes=1), 'hour': timedelta(hours=1),
+         'day': timedelta(days=1)}
+
+def series(rng, step, n):
+    return [{'date': str(NOW - step * i), 'price': rng.uniform(1000, 1800)}
+            for i in range(n, 0, -1)]
+
+def all_team_data(rng):
+    payload = {}
+    for t in range(30):
+        graph = {}
+        for window, (resolution, span) in GRAPH_WINDOWS.items():
+            step = STEPS[resolution]
+            n = 300 if span is None else int(span / step)
+            graph[window] = series(rng, step, n)
+        payload[f'T{t}'] = {'name': f'Team {t}', 'graph': graph,
+                            'price': {'date': str(NOW), 'price': 1500.0}}
+    return payload
+
+def leaderboard(rng, users):
+    values = sorted((rng.uniform(0, 1e5) for _ in range(users)), reverse=True)
+    return [{'rank': i + 1, 'username': f'user{i}', 'value': v}
+            for i, v in enumerate(values)]
+
+def usr_pg(rng):
+    return {'available_funds': 50000.0, 'total_assets': 61234.5,
+            'holdings': {f'T{t}': [{'num_shares': 3, 'purchased_for': 1500.0,
+                                    'purchased_at': str(NOW)}] for t in range(10)},
+            'graphData': {w: series(rng, timedelta(minutes=5), 2000)
+                          for w in GRAPH_WINDOWS}}
+
+def stream_len(payload):
+    return sum(len(chunk) for chunk in iter_encode(payload))
+
+ENCODERS = [
+    ('json.dumps', lambda p: len(dumps(p))),
+    ('encode', lambda p: len(encode(p))),
+    ('iter_encode', stream_len),
+]
+
+def measure(fn, payload, repeat):
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        size = fn(payload)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, size
+
+def main():
+    ap = ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--users', type=int, default=20000)
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+    rng = Random(args.seed)
+
+    payloads = [('allTeamData', all_team_data(rng)),
+                ('leaderboard', leaderboard(rng, args.users)),
+                ('usrPg', usr_pg(rng))]
+    for name, payload in payloads:
+        for enc, fn in ENCODERS:
+            elapsed, peak, size = measure(fn, payload, args.repeat)
+            print(f'{name:<12} {enc:<12} {elapsed * 1000:9.2f} ms '
+                  f'{peak / 2 ** 20:9.2f} MiB peak {size / 2 ** 20:8.2f} MiB out')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+'''Order-throughput benchmark for the trade path.
+
+Seeds teams and users into a scratch database, then times alternating
+buy/sell orders through queries.user. The entry points keep the same
+signature across versions, so running this on two checkouts gives a
+before/after comparison.
+
+    python -m fanbasemarket.bench.trades --url mysql://u:p@localhost/trades_bench
+
+Every table in --url is dropped first, so it must be a scratch database
+(see bench.scratch_app); the app's own database is never touched.
+'''
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+from nba_api.stats.static import teams
+
+from fanbasemarket import db
+from fanbasemarket.bench import scratch_app
+from fanbasemarket.models import User, Team
+from fanbasemarket.queries.user import buy_shares, sell_shares
+
+def main():
+    ap = ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--url', default='sqlite:///bench_trades.db')
+    ap.add_argument('--orders', type=int, default=2000)
+    ap.add_argument('--users', type=int, default=200)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+    rng = Random(args.seed)
+
+    bench = scratch_app(args.url)
+    with bench.app_context():
+        db.drop_all()
+        db.create_all()
+        for team in teams.get_teams():
+            db.session.add(Team(name=team['full_name'], abr=team['abbreviation'],
+                                price=1500.0, prev_price=1500.0))
+        for u in range(args.users):
+            db.session.add(User(username=f'bench{u}', email=f'bench{u}@example.com',
+                                password_hash='', available_funds=1e9))
+        db.session.commit()
+        abrs = [abr for abr, in db.session.query(Team.abr).all()]
+        users = User.query.all()
+
+        start = perf_counter()
+        for _ in range(args.orders // 2):
+            usr = rng.choice(users)
+            abr = rng.choice(abrs)
+            buy_shares(usr, abr, 1, db)
+            sell_shares(usr, abr, 1, db)
+        elapsed = perf_counter() - start
+        n = args.orders // 2 * 2
+        print(f'{n} orders in {elapsed:.2f}s: {n / elapsed:.1f} orders/s')
+        db.session.remove()
+
+if __name__ == '__main__':
+    main()
@@ -1,130 +1,262 @@
-from fanbasemarket.queries.team import set_player_rating
-from fanbasemarket.pricing.elo import simulate
-from fanbasemarket import db
+'''Seeds the market database: teams, players, ratings and 2019-20 prices.
+
+    python -m fanbasemarket.dbsetup                 # full rebuild
+    python -m fanbasemarket.dbsetup --resume        # after an interrupted run
+    python -m fanbasemarket.dbsetup --from prices   # rerun prices and later stages
+    python -m fanbasemarket.dbsetup --only bubble
+
+Stages run in STAGES order. Each one first removes whatever an earlier run
+of it wrote, so any stage can be rerun on its own. Finished stages are
+recorded in DBSETUP_STATE (per database) for --resume.
+'''
+from argparse import ArgumentParser
 from datetime import datetime
+from hashlib import sha1
+from json import dump, load
+from os import getenv, replace
+from time import perf_counter
 from nba_api.stats.static import teams
 import pandas as pd
+from sqlalchemy import or_
+
+from fanbasemarket import app, db
+from fanbasemarket.models import BlacklistedToken, Game, Listing, Player, \
+    Portfoliocheckpoint, Portfoliosnapshot, Purchase, PurchaseTransaction, Sale, \
+    Short, ShortTransaction, Team, Teamcandle, Teamprice, Unshort, User
+from fanbasemarket.pricing.elo import simulate_bulk
+from fanbasemarket.queries.candle import record_candles_bulk
+from fanbasemarket.queries import registry
+from fanbasemarket.queries.player import Roster
+from fanbasemarket.queries.team import invalidate_checkpoints
 
 INJURIES = {'2019-11-01':[['Paul George', 'Clippers', 'Month']],
     '2019-10-25': [['Deandre Ayton', 'Suns', 'Month']],
-    '2019-11-02':[['Stephen Curry', 'Warriors', 'Season']], 
-    '2019-12-18':[['Karl-Anthony Towns', 'Timberwolves', 'Month']], 
-    '2020-02-12':[['Karl-Anthony Towns', 'Timberwolves', 'Year']], 
-    '2020-02-05':[['Tyler Herro', 'Heat', 'Month']], 
+    '2019-11-02':[['Stephen Curry', 'Warriors', 'Season']],
+    '2019-12-18':[['Karl-Anthony Towns', 'Timberwolves', 'Month']],
+    '2020-02-12':[['Karl-Anthony Towns', 'Timberwolves', 'Year']],
+    '2020-02-05':[['Tyler Herro', 'Heat', 'Month']],
     '2019-11-16':[['Kyrie Irving', 'Nets', 'Month']],
-    '2019-12-20':[['Norman Powell', 'Raptors', 'Month']], 
+    '2019-12-20':[['Norman Powell', 'Raptors', 'Month']],
     '2019-10-23':[['Marvin Bagley III', 'Kings', 'Month']],
     '2020-01-22':[['Marvin Bagley III', 'Kings', 'Season']],
-    '2020-01-24':[['Lauri Markkanen', 'Bulls', 'Month']], 
-    '2020-01-31':[['Clint Capela', 'Hawks', 'Season'], ['Marc Gasol', 'Raptors', 'Season']], 
-    '2019-11-15':[['Jonathan Isaac', 'Magic', 'Month']], 
-    '2020-01-01':[['Jonathan Isaac', 'Magic', 'Season']], 
+    '2020-01-24':[['Lauri Markkanen', 'Bulls', 'Month']],
+    '2020-01-31':[['Clint Capela', 'Hawks', 'Season'], ['Marc Gasol', 'Raptors', 'Season']],
+    '2019-11-15':[['Jonathan Isaac', 'Magic', 'Month']],
+    '2020-01-01':[['Jonathan Isaac', 'Magic', 'Season']],
     '2020-03-05':[['Bradley Beal', 'Wizards', 'Season'], ['DeAndre Jordan', 'Nets', 'Season']],
     '2019-12-08':[['Rodney Hood', 'Trail Blazers', 'Season']]
 }
 
 STARTING_ELOS = {
-    '76ers': 1525, 'Bucks': 1575, 'Bulls': 1200, 'Cavaliers': 1000, 
-    'Celtics': 1455, 'Clippers': 1600, 'Grizzlies': 1100, 'Hawks': 1200, 
-    'Heat': 1325, 'Hornets': 1050, 'Jazz': 1475, 'Kings': 1250, 
-    'Knicks': 1200, 'Lakers': 1580, 'Magic': 1200, 'Mavericks': 1300, 
+    '76ers': 1525, 'Bucks': 1575, 'Bulls': 1200, 'Cavaliers': 1000,
+    'Celtics': 1455, 'Clippers': 1600, 'Grizzlies': 1100, 'Hawks': 1200,
+    'Heat': 1325, 'Hornets': 1050, 'Jazz': 1475, 'Kings': 1250,
+    'Knicks': 1200, 'Lakers': 1580, 'Magic': 1200, 'Mavericks': 1300,
     'Nets': 1350, 'Nuggets': 1450, 'Pacers': 1300, 'Pelicans': 1250,
     'Pistons': 1100, 'Raptors': 1345, 'Rockets': 1525, 'Spurs': 1300, 'Suns' : 1250,
     'Thunder': 1250, 'Timberwolves': 1200, 'Trail Blazers': 1415, 'Warriors': 1400,
     'Wizards': 1200
 }
 
+NOT_IN_BUBBLE = [
+    'Chicago Bulls',
+    'Charlotte Hornets',
+    'New York Knicks',
+    'Detroit Pistons',
+    'Atlanta Hawks',
+    'Cleveland Cavaliers',
+    'Minnesota Timberwolves',
+    'Golden State Warriors'
+]
+
 STRPTIME_FORMAT = '%m/%d/%Y'
 LOAD_START = '10/23/2019'
 
-K = 40
-
-H = 100
-
 LOAD_START = datetime.strptime(LOAD_START, STRPTIME_FORMAT)
 
-from fanbasemarket.models import *
+PLAYER_DATA = 'player_data/new_2k_ratings.csv'
+STATE_FILE = getenv('DBSETUP_STATE', 'dbsetup_state.json')
 
-db.create_all()
+# children first, so every delete is one statement per table
+ALL_TABLES = [Player, Purchase, PurchaseTransaction, Short, ShortTransaction,
+              Unshort, Teamprice, Teamcandle, Game, Listing, BlacklistedToken,
+              Sale, Portfoliosnapshot, Portfoliocheckpoint, Team, User]
 
-# Clear all current rows -- perfect for initial setup
-Player.query.delete()
-Purchase.query.delete()
-PurchaseTransaction.query.delete()
-Short.query.delete()
-Teamprice.query.delete()
-Game.query.delete()
-Listing.query.delete()
-BlacklistedToken.query.delete()
-Sale.query.delete()
-Team.query.delete()
-User.query.delete()
+# user activity that references teams: stages that delete teams leave it alone
+TRADE_TABLES = [Purchase, PurchaseTransaction, Sale, Short, ShortTransaction,
+                Unshort, Listing]
 
 def get_starting_elo(tname):
     for k in STARTING_ELOS.keys():
         if k in tname:
             return STARTING_ELOS[k]
 
-# Populate DB with NBA Teams
-teams_all = teams.get_teams()
-team_names = [(team['full_name'], team['abbreviation']) for team in teams_all]
-for t_name, t_abr in team_names:
-    p = get_starting_elo(t_name)
-    t_obj = Team(name=t_name, abr=t_abr, price=p, prev_price=p)
-    db.session.add(t_obj)
-    db.session.commit()
-    t_price = Teamprice(date=LOAD_START, team_id=t_obj.id, elo=p)
-    db.session.add(t_price)
+def refuse_if_traded(tids=None):
+    '''exits before deleting teams (all, or just tids) that trades still reference'''
+    for model in TRADE_TABLES:
+        query = db.session.query(model.id)
+        if tids is not None:
+            query = query.filter(model.team_id.in_(tids))
+        if query.first() is not None:
+            raise SystemExit(f'{model.__tablename__} still references these teams; '
+                             'run --from clear to start over')
+
+def games_of(tids):
+    return Game.query.filter(or_(Game.home.in_(tids), Game.away.in_(tids)))
+
+def clear():
+    '''empties every table -- perfect for initial setup'''
+    for model in ALL_TABLES:
+        model.query.delete()
     db.session.commit()
+    registry.invalidate()
+    return f'{len(ALL_TABLES)} tables emptied'
 
-print('teams added.')
-
-# Load player data
-df = pd.read_csv('player_data/new_2k_ratings.csv')
-for ix, row in df.iterrows():
-    name = row['Name']
-    pos1 = row['Primary']
-    pos2 = '' if pd.isna(row['Secondary']) else row['Secondary']
-    tid = Team.query.filter(Team.name.contains(row['Team'])).first().id
-    init_mpg = row['MPG']
-    rating = row['Rating']
-    new_p = Player(name=name, rating=rating, initial_mpg=init_mpg, mpg=init_mpg, \
-                    pos1=pos1, pos2=pos2, team_id=tid)
-    db.session.add(new_p)
+def add_teams():
+    refuse_if_traded()
+    for model in (Player, Teamcandle, Teamprice, Game, Team):
+        model.query.delete()
+    rows = []
+    for team in teams.get_teams():
+        p = get_starting_elo(team['full_name'])
+        rows.append({'name': team['full_name'], 'abr': team['abbreviation'],
+                     'price': p, 'prev_price': p})
+    db.session.bulk_insert_mappings(Team, rows)
     db.session.commit()
-for team in Team.query.all():
-    team.fs_rating = set_player_rating(team, db)
-    team.rating = set_player_rating(team, db)
-    db.session.add(team)
+    registry.invalidate()
+    return f'{len(rows)} teams added'
+
+def add_players():
+    Player.query.delete()
+    df = pd.read_csv(PLAYER_DATA)
+    tids = {fragment: registry.containing(fragment, db).id
+            for fragment in df['Team'].unique().tolist()}
+    rows = [{'name': name, 'rating': rating, 'initial_mpg': mpg, 'mpg': mpg,
+             'pos1': pos1, 'pos2': pos2, 'team_id': tids[team]}
+            for name, pos1, pos2, rating, team, mpg in zip(
+                df['Name'].tolist(), df['Primary'].tolist(),
+                df['Secondary'].fillna('').tolist(), df['Rating'].tolist(),
+                df['Team'].tolist(), df['MPG'].tolist())]
+    db.session.bulk_insert_mappings(Player, rows)
     db.session.commit()
-simulate(2019, 2020, 45, 100, True, INJURIES, db) 
+    return f'{len(rows)} players added'
 
-print('historical prices')
+def reset_players():
+    '''every player healthy and back on their initial minutes'''
+    Player.query.update({Player.mpg: Player.initial_mpg, Player.is_injured: False},
+                        synchronize_session=False)
 
-NOT_IN_BUBBLE = [
-    'Chicago Bulls',
-    'Charlotte Hornets',
-    'New York Knicks',
-    'Detroit Pistons',
-    'Atlanta Hawks',
-    'Cleveland Cavaliers',
-    'Minnesota Timberwolves',
-    'Golden State Warriors'
-]
+def rate_teams():
+    '''full strength and current rating: sum(rating * mpg) over the roster'''
+    reset_players()
+    rosters = Roster.load_all(db)
+    ratings = {tid: rosters[tid].strength() if tid in rosters else 0
+               for tid, in db.session.query(Team.id)}
+    db.session.bulk_update_mappings(Team, [
+        {'id': tid, 'fs_rating': r, 'rating': r} for tid, r in ratings.items()])
+    db.session.commit()
+    return f'{len(ratings)} teams rated'
+
+def add_prices():
+    '''the starting prices, then the 2019-20 season replayed through elo'''
+    Teamcandle.query.delete()
+    Teamprice.query.delete()
+    invalidate_checkpoints(LOAD_START, db)
+    reset_players()
+    Team.query.update({Team.rating: Team.fs_rating}, synchronize_session=False)
+    start = {tid: get_starting_elo(name)
+             for tid, name in db.session.query(Team.id, Team.name).order_by(Team.id)}
+    db.session.bulk_update_mappings(Team, [
+        {'id': tid, 'price': p, 'prev_price': p, 'delta': 0.0} for tid, p in start.items()])
+    db.session.bulk_insert_mappings(Teamprice, [
+        {'date': LOAD_START, 'team_id': tid, 'elo': p} for tid, p in start.items()])
+    record_candles_bulk([(tid, p, LOAD_START) for tid, p in start.items()], db)
+    db.session.commit()
+    sim = simulate_bulk(2019, 2020, 45, 100, True, INJURIES, db)
+    return f'{len(start) + len(sim.rows)} historical prices'
 
-for tname in NOT_IN_BUBBLE:
-    tm = Team.query.filter(Team.name == tname).first()
-    players = Player.query.filter(Player.team_id == tm.id).all()
-    for player in players:
-        db.session.delete(player)
-        db.session.commit()
-    prices = Teamprice.query.filter(Teamprice.team_id == tm.id).all()
-    for price in prices:
-        db.session.delete(price)
-        db.session.commit()
-    db.session.delete(tm)
+def remove_out_of_bubble():
+    registry.invalidate()
+    tids = [ref.id for ref in (registry.by_name(name, db) for name in NOT_IN_BUBBLE)
+            if ref is not None]
+    if tids:
+        refuse_if_traded(tids)
+        for model in (Player, Teamprice, Teamcandle):
+            model.query.filter(model.team_id.in_(tids)).delete(synchronize_session=False)
+        games_of(tids).delete(synchronize_session=False)
+        Team.query.filter(Team.id.in_(tids)).delete(synchronize_session=False)
     db.session.commit()
+    registry.invalidate()
+    return f'{len(tids)} out-of-bubble teams removed'
+
+STAGES = [('clear', clear), ('teams', add_teams), ('players', add_players),
+          ('ratings', rate_teams), ('prices', add_prices),
+          ('bubble', remove_out_of_bubble)]
+STAGE_NAMES = [name for name, _ in STAGES]
+
+def database_key():
+    return sha1(str(db.engine.url).encode()).hexdigest()
+
+def read_state():
+    '''names of the stages finished against this database, in order'''
+    try:
+        with open(STATE_FILE) as f:
+            state = load(f)
+    except (OSError, ValueError):
+        return []
+    return state.get(database_key(), [])
+
+def write_state(done):
+    try:
+        with open(STATE_FILE) as f:
+            state = load(f)
+    except (OSError, ValueError):
+        state = {}
+    state[database_key()] = done
+    with open(f'{STATE_FILE}.tmp', 'w') as f:
+        dump(state, f)
+    replace(f'{STATE_FILE}.tmp', STATE_FILE)
+
+def run(names):
+    '''runs the named stages in order; a stage invalidates every later one'''
+    done = read_state()
+    total = perf_counter()
+    for n, name in enumerate(names, 1):
+        done = [d for d in done if STAGE_NAMES.index(d) < STAGE_NAMES.index(name)]
+        write_state(done)
+        start = perf_counter()
+        summary = dict(STAGES)[name]()
+        done.append(name)
+        write_state(done)
+        print(f'[{n}/{len(names)}] {name}: {summary} ({perf_counter() - start:.2f}s)')
+    print(f'done in {perf_counter() - total:.2f}s')
+
+def main():
+    ap = ArgumentParser(description=__doc__.splitlines()[0])
+    which = ap.add_mutually_exclusive_group()
+    which.add_argument('--resume', action='store_true',
+                       help='run the stages after the last one that finished')
+    which.add_argument('--from', dest='start', choices=STAGE_NAMES,
+                       help='run this stage and every one after it')
+    which.add_argument('--only', nargs='+', choices=STAGE_NAMES)
+    args = ap.parse_args()
 
-print('out-of-bubble teams removed')
+    with app.app_context():
+        db.create_all()
+        if args.only:
+            names = [name for name in STAGE_NAMES if name in args.only]
+        elif args.start:
+            names = STAGE_NAMES[STAGE_NAMES.index(args.start):]
+        elif args.resume:
+            done = read_state()
+            names = STAGE_NAMES[STAGE_NAMES.index(done[-1]) + 1:] if done else STAGE_NAMES
+        else:
+            names = STAGE_NAMES
+        if names:
+            run(names)
+        else:
+            print('nothing to resume: every stage has finished')
+        db.session.remove()
 
-db.session.remove()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+'''Response encoding shared by the routes and the prebuilt snapshots.'''
+from zlib import compressobj
+import brotli
+import orjson
+
+# datetime keys/values serialize natively; numpy scalars from the graph code too
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# payloads with more top-level entries than this are streamed
+STREAM_THRESHOLD = 1000
+STREAM_CHUNK = 64 * 1024
+
+def encode(payload):
+    return orjson.dumps(payload, option=OPTIONS)
+
+def iter_encode(payload):
+    '''encodes a dict or list one top-level entry at a time, yielding ~STREAM_CHUNK byte pieces'''
+    if isinstance(payload, dict):
+        opener, closer = b'{', b'}'
+        parts = (encode({k: v})[1:-1] for k, v in payload.items())
+    else:
+        opener, closer = b'[', b']'
+        parts = (encode(v) for v in payload)
+    buf = bytearray(opener)
+    first = True
+    for part in parts:
+        if not first:
+            buf += b','
+        first = False
+        buf += part
+        if len(buf) >= STREAM_CHUNK:
+            yield bytes(buf)
+            buf.clear()
+    buf += closer
+    yield bytes(buf)
+
+def compressor(encoding):
+    '''(process, finish) for the 'br' or 'gzip' encoding'''
+    if encoding == 'br':
+        c = brotli.Compressor(quality=5)
+        return c.process, c.finish
+    c = compressobj(6, wbits=31)
+    return c.compress, c.flush
+
+def compress_body(data, encoding):
+    process, finish = compressor(encoding)
+    return process(data) + finish()
+
+def iter_compress(chunks, encoding):
+    process, finish = compressor(encoding)
+    for chunk in chunks:
+        out = process(chunk)
+        if out:
+            yield out
+    yield finish()
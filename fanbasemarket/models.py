@@ -58,6 +58,10 @@ class Player(db.Model):
 
 class Purchase(db.Model):
     __tablename__ = 'purchase'
+    __table_args__ = (
+        db.Index('ix_purchase_user_team_exists', 'user_id', 'team_id', 'exists', 'amt_shares'),
+        db.Index('ix_purchase_team_purchased_at', 'team_id', 'purchased_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -76,6 +80,9 @@ class Purchase(db.Model):
 
 class Teamprice(db.Model):
     __tablename__ = 'teamprice'
+    __table_args__ = (
+        db.Index('ix_teamprice_team_date', 'team_id', 'date', 'elo'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, index=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
@@ -86,6 +93,28 @@ class Teamprice(db.Model):
                       'team_id': self.team_id, 'elo': self.elo})
 
 
+class Teamcandle(db.Model):
+    __tablename__ = 'teamcandle'
+    __table_args__ = (
+        db.UniqueConstraint('team_id', 'resolution', 'bucket'),
+        db.Index('ix_teamcandle_resolution_bucket', 'resolution', 'bucket'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
+    resolution = db.Column(db.String(10))
+    bucket = db.Column(db.DateTime)
+    open = db.Column(db.Float)
+    high = db.Column(db.Float)
+    low = db.Column(db.Float)
+    close = db.Column(db.Float)
+
+    def serialize(self):
+        return dumps({'team_id': self.team_id, 'resolution': self.resolution,
+                      'bucket': self.bucket, 'open': self.open,
+                      'high': self.high, 'low': self.low,
+                      'close': self.close})
+
+
 class Game(db.Model):
     __tablename__ = 'game'
     id = db.Column(db.Integer, primary_key=True)
@@ -122,6 +151,10 @@ class BlacklistedToken(db.Model):
 
 class Sale(db.Model):
     __tablename__ = 'sale'
+    __table_args__ = (
+        db.Index('ix_sale_team_date', 'team_id', 'date'),
+        db.Index('ix_sale_user_date', 'user_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -131,6 +164,9 @@ class Sale(db.Model):
 
 class PurchaseTransaction(db.Model):
     __tablename__ = 'purchasetransaction'
+    __table_args__ = (
+        db.Index('ix_purchasetransaction_user_date', 'user_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
     date = db.Column(db.DateTime)
@@ -140,6 +176,9 @@ class PurchaseTransaction(db.Model):
 
 class Short(db.Model):
     __tablename__ = 'short'
+    __table_args__ = (
+        db.Index('ix_short_user_team_exists', 'user_id', 'team_id', 'exists'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -152,6 +191,10 @@ class Short(db.Model):
 
 class ShortTransaction(db.Model):
     __tablename__ = 'shorttransaction'
+    __table_args__ = (
+        db.Index('ix_shorttransaction_team_shorted_at', 'team_id', 'shorted_at'),
+        db.Index('ix_shorttransaction_user_shorted_at', 'user_id', 'shorted_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -161,9 +204,31 @@ class ShortTransaction(db.Model):
 
 class Unshort(db.Model):
     __tablename__ = 'unshort'
+    __table_args__ = (
+        db.Index('ix_unshort_team_unshorted_at', 'team_id', 'unshorted_at'),
+        db.Index('ix_unshort_user_unshorted_at', 'user_id', 'unshorted_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     unshorted_for = db.Column(db.Float)
     unshorted_at = db.Column(db.DateTime)
     amt_unshorted = db.Column(db.Integer)
+
+class Portfoliosnapshot(db.Model):
+    __tablename__ = 'portfoliosnapshot'
+    __table_args__ = (
+        db.Index('ix_portfoliosnapshot_user_date', 'user_id', 'date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    date = db.Column(db.DateTime)
+    value = db.Column(db.Float)
+
+class Portfoliocheckpoint(db.Model):
+    __tablename__ = 'portfoliocheckpoint'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True)
+    date = db.Column(db.DateTime)
+    funds = db.Column(db.Float)
+    holdings = db.Column(db.Text)
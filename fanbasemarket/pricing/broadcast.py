@@ -0,0 +1,131 @@
+'''Coalesced 'prices' socket events.
+
+Every flush sends {'from': f, 'to': t, 'prices': [{abr: {'date', 'price',
+'seq'}}, ...]} with the latest tick per team. The event brings its room up
+to date from sequence f to t. Coalescing skips sequence numbers on purpose,
+so a client keeps the last to it saw, per team if it subscribed to teams, and
+treats only from > that last to as a lost event. In that case it sends
+'resync'. A snapshot's seq counts as a to. In the all-teams room, from is
+always the previous event's to; in a team's room it is the to of that team's
+previous event.
+'price' is the team's price once the tick is committed. Before
+batching, each trade emitted its own fill price (price * 1.0025 for a buy).
+For a single trade that is the same number, since the trade moves the price
+onto its fill. A batch of orders moves the price once by their net flow, so
+'price' is that post-batch price, and individual fills differ from it. Each
+trader gets their fill in the HTTP response of their order.
+'''
+from threading import Lock
+from flask import request
+from flask_socketio import emit, join_room, leave_room
+
+from fanbasemarket import io, get_db
+from fanbasemarket.pricing import ticker
+
+ALL_ROOM = 'prices'
+
+_lock = Lock()
+_pending = {}
+_sinks = []
+# 'to' of the last event sent to the all-teams room, and to each team's room
+_flushed = 0
+_team_flushed = {}
+
+def team_room(abr):
+    return f'prices:{abr}'
+
+def price_item(tick):
+    return {tick.abr: {'date': str(tick.date), 'price': tick.price, 'seq': tick.seq}}
+
+def prices_event(start, end, ticks):
+    return {'from': start, 'to': end, 'prices': [price_item(t) for t in ticks]}
+
+def sink(fn):
+    '''fn(ticks) is also handed every flushed batch (latest tick per team)'''
+    _sinks.append(fn)
+    return fn
+
+@ticker.subscribe
+def on_price(old, new):
+    '''keeps only the latest price per team until the next flush'''
+    with _lock:
+        _pending[new.abr] = new
+
+def flush():
+    global _flushed
+    with _lock:
+        ticks = list(_pending.values())
+        _pending.clear()
+        if not ticks:
+            return
+        end = max(t.seq for t in ticks)
+        start, _flushed = _flushed, end
+        team_start = {t.abr: _team_flushed.get(t.abr, 0) for t in ticks}
+        _team_flushed.update((t.abr, end) for t in ticks)
+    io.emit('prices', prices_event(start, end, ticks), room=ALL_ROOM, namespace='/')
+    for t in ticks:
+        io.emit('prices', prices_event(team_start[t.abr], end, [t]),
+                room=team_room(t.abr), namespace='/')
+    for fn in _sinks:
+        fn(ticks)
+
+def run(interval):
+    '''flushes pending prices at most once every `interval` seconds'''
+    while True:
+        io.sleep(interval)
+        flush()
+
+def resync(seq, epoch):
+    '''brings the calling client up to date from its last seen (epoch, seq)
+
+    Replays the missed ticks (latest per team) as a 'prices' event from seq
+    when the tick log still covers them, otherwise sends a 'snapshot' of
+    every price.
+    '''
+    missed = None
+    if seq is not None and epoch == ticker.EPOCH:
+        missed = ticker.since(seq)
+    if missed is not None:
+        latest = {t.abr: t for t in missed}
+        if latest:
+            emit('prices', prices_event(seq, missed[-1].seq, latest.values()))
+        return
+    ticks, version = ticker.snapshot(get_db())
+    emit('snapshot', {'epoch': ticker.EPOCH, 'seq': version,
+                      'prices': {abr: t.price for abr, t in ticks.items()}})
+
+def as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+@io.on('connect')
+def on_connect():
+    '''?seq=&epoch= from the client's last seen tick; without them it gets a snapshot'''
+    join_room(ALL_ROOM)
+    resync(as_int(request.args.get('seq')), as_int(request.args.get('epoch')))
+
+@io.on('resync')
+def on_resync(data):
+    '''{'seq': n, 'epoch': e}: sent by a client whose last 'to' (or snapshot
+    seq) n is behind the 'from' of an event it received'''
+    data = data or {}
+    resync(as_int(data.get('seq')), as_int(data.get('epoch')))
+
+@io.on('subscribe')
+def on_subscribe(data):
+    '''{'teams': [abr, ...]}: only receive prices for these teams'''
+    data = data or {}
+    leave_room(ALL_ROOM)
+    for abr in data.get('teams', []):
+        join_room(team_room(abr))
+
+@io.on('unsubscribe')
+def on_unsubscribe(data):
+    '''{'teams': [abr, ...]} to drop teams, {'all': true} to go back to every team'''
+    data = data or {}
+    for abr in data.get('teams', []):
+        leave_room(team_room(abr))
+    if data.get('all'):
+        join_room(ALL_ROOM)
@@ -0,0 +1,95 @@
+'''Opt-in compact price stream.
+
+A client emits 'negotiate' {'encoding': 'msgpack'} and from then on gets
+binary 'p' frames instead of the JSON 'prices' list:
+
+    msgpack([seq, base, ts, [team_id, price, team_id, price, ...]])
+
+seq is the ticker sequence of the newest tick in the frame, the same number
+the JSON stream carries. Prices are integer hundredths. With base == 0 they
+are absolute (a full snapshot); otherwise they are deltas against the prices
+the client had at sequence `base`, its last 'ack' {'seq': n}. ts is one
+epoch-second timestamp for the whole batch.
+'''
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from flask import request
+from flask_socketio import leave_room
+import msgpack
+
+from fanbasemarket import app, db, io
+from fanbasemarket.pricing import ticker
+from fanbasemarket.pricing.broadcast import ALL_ROOM, sink
+
+HISTORY = 64
+
+_lock = Lock()
+_clients = {}
+_history = OrderedDict()
+_state = None
+# ticker sequence _state is current to
+_seq = 0
+
+def to_units(price):
+    return int(round(price * 100))
+
+def frame(base_state, base):
+    '''packs the current prices against base_state (None: full snapshot)'''
+    pairs = []
+    for tid, units in _state.items():
+        if base_state is None:
+            pairs += [tid, units]
+        elif base_state.get(tid) != units:
+            pairs += [tid, units - base_state.get(tid, 0)]
+    return msgpack.packb([_seq, base if base_state is not None else 0,
+                          int(time()), pairs])
+
+@sink
+def flush(ticks):
+    '''encodes one batch of ticks once per distinct client ack and sends it'''
+    global _state, _seq
+    with _lock:
+        if _state is None:
+            # every team, not just the ones the ticker happens to hold yet
+            with app.app_context():
+                known, _seq = ticker.snapshot(db)
+            _state = {t.id: to_units(t.price) for t in known.values()}
+        _state = dict(_state)
+        for tick in ticks:
+            if tick.seq > _seq:
+                _state[tick.id] = to_units(tick.price)
+        _seq = max([_seq] + [tick.seq for tick in ticks])
+        _history[_seq] = _state
+        while len(_history) > HISTORY:
+            _history.popitem(last=False)
+        groups = {}
+        for sid, ack in _clients.items():
+            groups.setdefault(ack, []).append(sid)
+        frames = {ack: frame(_history.get(ack), ack) for ack in groups}
+    for ack, sids in groups.items():
+        for sid in sids:
+            io.emit('p', frames[ack], room=sid, namespace='/')
+
+@io.on('negotiate')
+def on_negotiate(data):
+    data = data or {}
+    if data.get('encoding') != 'msgpack':
+        return {'encoding': 'json'}
+    leave_room(ALL_ROOM)
+    with _lock:
+        _clients[request.sid] = None
+    return {'encoding': 'msgpack'}
+
+@io.on('ack')
+def on_ack(data):
+    data = data or {}
+    seq = data.get('seq')
+    with _lock:
+        if request.sid in _clients and seq in _history:
+            _clients[request.sid] = seq
+
+@io.on('disconnect')
+def on_disconnect():
+    with _lock:
+        _clients.pop(request.sid, None)
@@ -1,9 +1,15 @@
 from datetime import datetime, timedelta
-from string import capwords
+import logging
+import numpy as np
+from fanbasemarket.pricing import ticker
 from fanbasemarket.pricing.utils import get_schedule_range
-from fanbasemarket.queries.team import update_teamPrice, active_player_rating
-from fanbasemarket.queries.player import new_injury_mins
-from fanbasemarket.models import Player, Team
+from fanbasemarket.queries import registry
+from fanbasemarket.queries.candle import record_candles_bulk
+from fanbasemarket.queries.team import update_teamPrice, invalidate_checkpoints
+from fanbasemarket.queries.player import Roster
+from fanbasemarket.models import Player, Team, Teamprice
+
+log = logging.getLogger(__name__)
 
 def proj_home_win_pct(h, elo_diff):
     '''probability of home team winning based on elo ratings'''
@@ -24,46 +30,37 @@ def season_elo_reset(team, date, db):
     newprice = (.75 * team.price) + 375
     update_teamPrice(team, newprice - team.price, date, db)
 
+def injured_player_team(player_name, db):
+    '''team of the first player with this name, the one the injury lists
+    mean; None if nobody has it'''
+    found = db.session.query(Player.team_id).\
+        filter(Player.name == player_name).\
+        order_by(Player.id).first()
+    return None if found is None else found[0]
+
 def apply_injury(team, player_name, duration, date, db):
     end_of_season = datetime.strptime('2020-03-08', '%Y-%m-%d')
     days_left = (end_of_season - date).days
-    # injure player
-    inj_player = Player.query.filter(Player.name==player_name).first()
-    inj_player.is_injured = True
-    inj_mpg = inj_player.mpg
-    inj_player.mpg = 0
-    db.session.add(inj_player)
-    db.session.commit()
-    # rebalance minutes
-    players = Player.query.filter(Player.team_id==team.id).all()
-    total_rating = sum([player.rating for player in players])
-    for player in players:
-        if not player.is_injured:
-            if inj_player.pos2 != '':
-                if player.pos1 == inj_player.pos1:
-                    player.mpg += (player.rating / total_rating) * (inj_mpg * .4225)
-                if player.pos2 == inj_player.pos1:
-                    player.mpg += (player.rating / total_rating) * (inj_mpg * .2275)
-                if player.pos1 == inj_player.pos2:
-                    player.mpg += (player.rating / total_rating) * (inj_mpg * .2275)
-                if player.pos2 == inj_player.pos2:
-                    player.mpg += (player.rating / total_rating) * (inj_mpg * .1225)
-            else:
-                if player.pos1 == inj_player.pos1:
-                    player.mpg = inj_mpg * .65
-                if player.pos2 == inj_player.pos1:
-                    player.mpg = inj_mpg * .35
-            if player.mpg > 35.5:
-                player.mpg = 35.5
-            db.session.add(player)
-            db.session.commit()
-    team.rating = active_player_rating(team, db)
+    tid = injured_player_team(player_name, db)
+    if tid is None:
+        log.warning('skipping injury to %s: no such player', player_name)
+        return
+    # injure player and rebalance minutes on the team the injury is listed under
+    roster = Roster.load(team.id, db, stored=float_storage(db))
+    if tid == team.id:
+        roster.injure(player_name)
+    else:
+        home = Roster.load(tid, db, stored=float_storage(db))
+        inj = home.bench(player_name)
+        home.save(db)
+        roster.rebalance(*inj)
+    roster.save(db)
+    team.rating = roster.strength()
     db.session.add(team)
     db.session.commit()
-    ps = Player.query.filter(Player.team_id == team.id).filter(Player.is_injured == False).all()
     print(f'WHEN {player_name} GOT INJURED for a {duration}:')
-    for p in ps:
-        print(f'{p.name}: {p.mpg}')
+    for name, mpg in roster.minutes():
+        print(f'{name}: {mpg}')
     print('')
     print(f'Full Strength Rating: {team.fs_rating}')
     print(f'Rating: {team.rating}')
@@ -91,17 +88,20 @@ def apply_injury(team, player_name, duration, date, db):
     update_teamPrice(team, (-sev / 100) * team.price, date, db)
 
 def recover_from_injury(team, player_name, db):
-    inj_player = Player.query.filter(Player.name==player_name).first()
-    inj_player.mpg = inj_player.initial_mpg
-    db.session.add(inj_player)
+    tid = injured_player_team(player_name, db)
+    if tid is None:
+        return
+    roster = Roster.load(team.id, db, stored=float_storage(db))
+    if tid == team.id:
+        roster.recover(player_name)
+    else:
+        home = Roster.load(tid, db, stored=float_storage(db))
+        i = home.index(player_name)
+        home.restore(player_name)
+        home.save(db)
+        roster.restore_positions(home.pos1[i], home.pos2[i])
+    roster.save(db)
     db.session.commit()
-    players = Player.query.filter(Player.team_id==team.id).all()
-    for player in players:
-        if player.pos1 == inj_player.pos1 or player.pos2 == inj_player.pos1 or \
-           player.pos1 == inj_player.pos2 or player.pos2 == inj_player.pos2:
-           player.mpg = player.initial_mpg
-           db.session.add(player)
-           db.session.commit()
 
 def simulate(start_yr, end_yr, k, h, use_mov, injuries, db):
     active_injuries = []
@@ -123,12 +123,12 @@ def simulate(start_yr, end_yr, k, h, use_mov, injuries, db):
                     if date_obj < d:
                         new.append((d, active_inj))
                     else:
-                        inj_team = Team.query.filter(Team.name.contains(injury[1])).first()
+                        inj_team = Team.query.get(registry.containing(injury[1], db).id)
                         recover_from_injury(inj_team, injury[0], db)
                 active_injuries = new
                 if date in injuries.keys():
                     for injury in injuries[date]:
-                        inj_team = Team.query.filter(Team.name.contains(injury[1])).first()
+                        inj_team = Team.query.get(registry.containing(injury[1], db).id)
                         apply_injury(inj_team, injury[0], injury[2], date_obj, db)
                         if injury[2] == 'Day':
                             ret_d = date_obj + timedelta(days=1)
@@ -139,13 +139,174 @@ def simulate(start_yr, end_yr, k, h, use_mov, injuries, db):
                         else:
                             ret_d = season_end
                         active_injuries.append((ret_d, injury))
-            home_tname = capwords(game['home_team'].name.replace('_', ' '))
-            away_tname = capwords(game['away_team'].name.replace('_', ' '))
-            home_team = Team.query.filter(Team.name==home_tname).first()
-            away_team = Team.query.filter(Team.name==away_tname).first()
+            home_team = Team.query.get(registry.by_bbref(game['home_team'], db).id)
+            away_team = Team.query.get(registry.by_bbref(game['away_team'], db).id)
             score_diff = int(game['home_team_score']) - int(game['away_team_score'])
             elo_diff = home_team.price - away_team.price
             elo_change = home_rating_change(k, h, score_diff, elo_diff, use_mov)
             update_teamPrice(home_team, elo_change, date_obj, db)
             update_teamPrice(away_team, -elo_change, date_obj, db)
             prev_date = date
+
+def float_storage(db):
+    '''what a Float column gives back after a commit on this backend
+
+    MySQL FLOAT is single precision and is read back as the shortest
+    decimal for the float32; SQLite and Postgres keep the double.
+    '''
+    if db.engine.dialect.name == 'mysql':
+        return lambda x: float(str(np.float32(x)))
+    return float
+
+class SeasonSimulator:
+    '''simulate() without the per-update round-trips.
+
+    Team ratings live in arrays and players in per-team Rosters; every value
+    simulate() would re-read from a Float column goes through `stored`, so
+    the Teamprice rows (collected in `rows`) match it exactly.
+    '''
+
+    def __init__(self, db, stored=None):
+        self.db = db
+        self.stored = stored or float_storage(db)
+        self.teams = db.session.query(Team).order_by(Team.id).all()
+        self.slot = {t.id: i for i, t in enumerate(self.teams)}
+        self.price = np.array([t.price for t in self.teams], dtype=float)
+        self.prev_price = np.array([t.prev_price for t in self.teams], dtype=float)
+        self.delta = np.array([t.delta for t in self.teams], dtype=float)
+        self.rating = np.array([t.rating for t in self.teams], dtype=float)
+        self.fs_rating = np.array([t.fs_rating for t in self.teams], dtype=float)
+        self.rosters = Roster.load_all(db, self.stored)
+        self.rows = []
+
+    def update(self, i, delta, dt):
+        '''update_teamPrice'''
+        newprice = float(self.price[i]) + delta
+        self.prev_price[i] = self.price[i]
+        self.price[i] = self.stored(newprice)
+        self.delta[i] = self.stored(delta)
+        self.rows.append({'team_id': self.teams[i].id, 'date': dt, 'elo': newprice})
+
+    def season_reset(self, i, date):
+        p = float(self.price[i])
+        newprice = (.75 * p) + 375
+        self.update(i, newprice - p, date)
+
+    def injured_player_team(self, player_name):
+        '''injured_player_team(), from the rosters in memory'''
+        found = [tid for tid, roster in self.rosters.items()
+                 if player_name in roster.slot]
+        return min(found, key=lambda tid: self.rosters[tid].ids[
+            self.rosters[tid].index(player_name)]) if found else None
+
+    def apply_injury(self, team_id, player_name, duration, date):
+        end_of_season = datetime.strptime('2020-03-08', '%Y-%m-%d')
+        days_left = (end_of_season - date).days
+        tid = self.injured_player_team(player_name)
+        if tid is None:
+            log.warning('skipping injury to %s: no such player', player_name)
+            return
+        roster = self.rosters[team_id]
+        if tid == team_id:
+            roster.injure(player_name)
+        else:
+            roster.rebalance(*self.rosters[tid].bench(player_name))
+        i = self.slot[team_id]
+        self.rating[i] = self.stored(roster.strength())
+        fs_rating, rating = float(self.fs_rating[i]), float(self.rating[i])
+        sev = 100 * (fs_rating - rating) / fs_rating
+        if duration == 'Day':
+            sev = sev * .1
+        elif duration == 'Week':
+            sev = sev * .225
+        elif duration == 'Month':
+            sev = sev * .5
+        else:
+            sev = sev * .69
+        if days_left < 100 and duration == 'Month':
+            sev = sev + ((100 -days_left) * .1)
+        if days_left < 70 and duration == 'Week':
+            sev = sev + ((70 - days_left) * .2)
+        if days_left < 63 and duration == 'Day':
+            sev = sev + ((63 - days_left) * .2)
+        self.update(i, (-sev / 100) * float(self.price[i]), date)
+
+    def recover_from_injury(self, team_id, player_name):
+        tid = self.injured_player_team(player_name)
+        if tid == team_id:
+            self.rosters[team_id].recover(player_name)
+        elif tid is not None:
+            home = self.rosters[tid]
+            i = home.index(player_name)
+            home.restore(player_name)
+            self.rosters[team_id].restore_positions(home.pos1[i], home.pos2[i])
+
+    def run(self, seasons, k, h, use_mov, injuries):
+        db = self.db
+        active_injuries = []
+        for season in seasons:
+            season_start = season[0]['start_time']
+            season_end = season[-1]['start_time'].replace(tzinfo=None)
+            for i in range(len(self.teams)):
+                self.season_reset(i, season_start)
+            prev_date = season_start - timedelta(days=1)
+            for game in season:
+                if game['home_team_score'] is None:
+                    continue
+                date_obj = game['start_time'].replace(tzinfo=None)
+                date = date_obj.strftime('%Y-%m-%d')
+                if date != prev_date:
+                    new = []
+                    for d, active_inj in active_injuries:
+                        if date_obj < d:
+                            new.append((d, active_inj))
+                        else:
+                            # as in simulate(): recovers the last injury applied
+                            self.recover_from_injury(registry.containing(injury[1], db).id,
+                                                     injury[0])
+                    active_injuries = new
+                    if date in injuries.keys():
+                        for injury in injuries[date]:
+                            self.apply_injury(registry.containing(injury[1], db).id,
+                                              injury[0], injury[2], date_obj)
+                            if injury[2] == 'Day':
+                                ret_d = date_obj + timedelta(days=1)
+                            elif injury[2] == 'Week':
+                                ret_d = date_obj + timedelta(weeks=1)
+                            elif injury[2] == 'Month':
+                                ret_d = date_obj + timedelta(weeks=4)
+                            else:
+                                ret_d = season_end
+                            active_injuries.append((ret_d, injury))
+                home = self.slot[registry.by_bbref(game['home_team'], db).id]
+                away = self.slot[registry.by_bbref(game['away_team'], db).id]
+                score_diff = int(game['home_team_score']) - int(game['away_team_score'])
+                elo_diff = float(self.price[home]) - float(self.price[away])
+                elo_change = home_rating_change(k, h, score_diff, elo_diff, use_mov)
+                self.update(home, elo_change, date_obj)
+                self.update(away, -elo_change, date_obj)
+                prev_date = date
+
+    def save(self):
+        '''one bulk insert of the price rows; teams, players and candles in the same commit'''
+        db = self.db
+        db.session.bulk_insert_mappings(Teamprice, self.rows)
+        record_candles_bulk([(r['team_id'], r['elo'], r['date']) for r in self.rows], db)
+        for i, team in enumerate(self.teams):
+            team.price = float(self.price[i])
+            team.prev_price = float(self.prev_price[i])
+            team.delta = float(self.delta[i])
+            team.rating = float(self.rating[i])
+        for roster in self.rosters.values():
+            roster.save(db)
+        if self.rows:
+            invalidate_checkpoints(min(r['date'] for r in self.rows), db)
+        db.session.commit()
+        ticker.invalidate()
+
+def simulate_bulk(start_yr, end_yr, k, h, use_mov, injuries, db):
+    '''simulate(), run in memory and written with one bulk insert'''
+    sim = SeasonSimulator(db)
+    sim.run(get_schedule_range(start_yr, end_yr), k, h, use_mov, injuries)
+    sim.save()
+    return sim
@@ -1,29 +1,70 @@
-from requests import get
-from nba_api.stats.static import teams
-from fanbasemarket.pricing.nba_data import liveGame, mov_multiplier
-from fanbasemarket.queries.team import update_teamPrice, set_teamPrice
+from fanbasemarket.pricing.nba_data import liveGames, mov_multiplier
+from fanbasemarket.queries.team import set_teamPrice
+from fanbasemarket.pricing import ticker
+from fanbasemarket.pricing.scoreboard import ScoreboardClient
 from fanbasemarket.models import Team, Teamprice, Purchase, Sale, ShortTransaction, Unshort, Game
 from datetime import datetime
 from dateutil import parser
 from pytz import timezone
+from sqlalchemy import and_, func, literal, or_
 
 EST = timezone('US/Eastern')
 
-generate_url = lambda s: f'http://data.nba.net/10s/prod/v1/{s}/scoreboard.json'
+source = ScoreboardClient()
+
+def use_source(src):
+    '''swaps where bigboy_pulls_only gets games and the time from (e.g. a ReplaySource)'''
+    global source
+    source = src
+
+# (model, time column, flow it counts towards, sign)
+FLOWS = [
+    (Purchase, Purchase.purchased_at, 'buy', 1),
+    (Sale, Sale.date, 'buy', -1),
+    (ShortTransaction, ShortTransaction.shorted_at, 'short', -1),
+    (Unshort, Unshort.unshorted_at, 'short', 1),
+]
+
+def order_flow(windows, until, db):
+    '''{team_id: {'buy': buys - sales, 'short': unshorts - shorts}} in one query
+
+    windows maps team_id to the time its flow starts counting (tipoff)
+    '''
+    flow = {tid: {'buy': 0, 'short': 0} for tid in windows}
+    if not windows:
+        return flow
+    selects = []
+    for model, col, kind, sign in FLOWS:
+        in_window = or_(*[and_(model.team_id == tid, col >= start, col <= until)
+                          for tid, start in windows.items()])
+        selects.append(db.session.query(model.team_id, literal(kind),
+                                        func.count(model.id) * sign).
+                       filter(in_window).group_by(model.team_id))
+    for tid, kind, n in selects[0].union_all(*selects[1:]).all():
+        flow[tid][kind] += int(n)
+    return flow
+
+def pregame_elo(team_id, start, db):
+    '''the team's last recorded price at or before tipoff'''
+    return db.session.query(Teamprice.elo).\
+        filter(Teamprice.team_id == team_id).\
+        filter(Teamprice.date <= start).\
+        order_by(Teamprice.date.desc(), Teamprice.id.desc()).\
+        first()[0]
 
 def bigboy_pulls_only(db):
     k = 75
     h = 10
-    today = datetime.now(EST)
-    url = generate_url(today.strftime('%Y%m%d'))
-    games = get(url).json()['games']
-    nba_teams = teams.get_teams()
-    prices = {}
+    today = source.now()
+    games = source.fetch(today)
+    if games is None:
+        # unchanged since the last pull (or unreachable): nothing to reprice
+        return []
     ret = []
     for game in games:
         l = {}
         l['id'] = game['gameId']
-        l['start'] = str(parser.parse(game['startTimeUTC']).astimezone(EST))
+        l['start'] = parser.parse(game['startTimeUTC']).astimezone(EST)
         l['is_on'] = game['isGameActivated']
         l['arena'] = game['arena']['name']
         ht, vt = game['hTeam'], game['vTeam']
@@ -37,12 +78,20 @@ def bigboy_pulls_only(db):
         l['period'] = game['period']['current']
         l['clock'] = game['clock']
         ret.append(l)
+    live = {}
+    for i in ret:
+        if i['is_on'] and not (i['home_score'] == 0 and i['away_score'] == 0):
+            live[ticker.get(i['home_team'], db).id] = i['start']
+            live[ticker.get(i['away_team'], db).id] = i['start']
+    flow = order_flow(live, today, db)
     results = []
+    pending = []
+    live_inputs = []
     for i in ret:
         home_abv = i['home_team']
         away_abv = i['away_team']
-        home_tObj = Team.query.filter(Team.abr == home_abv).first()
-        away_tObj = Team.query.filter(Team.abr == away_abv).first()
+        home_tick = ticker.get(home_abv, db)
+        away_tick = ticker.get(away_abv, db)
         if not i['is_on']:
             if i['home_score'] != 0.0 or i['away_score'] != 0.0:
                 match = db.session.query(Game).\
@@ -50,6 +99,8 @@ def bigboy_pulls_only(db):
                     first()
                 if match is not None:
                     continue
+                home_tObj = db.session.query(Team).get(home_tick.id)
+                away_tObj = db.session.query(Team).get(away_tick.id)
                 newgame = Game(gameid=i['id'], home=home_tObj.id, away=away_tObj.id, home_score=i['home_score'], away_score=i['away_score'], start=i['start'])
                 db.session.add(newgame)
                 db.session.commit()
@@ -135,21 +186,8 @@ def bigboy_pulls_only(db):
         score_margin = i['score_margin']
         period = i['period']
         clock = i['clock']
-        for team in nba_teams:
-            if str(team['abbreviation']) == home_abv:
-                home_team = str([team["nickname"]])
-                prices[home_team] = 0
-            elif str(team['abbreviation']) == away_abv:
-                away_team = str([team["nickname"]])
-                prices[away_team] = 0
-        home_elo = Teamprice.query.\
-            filter(Teamprice.team_id == home_tObj.id).\
-            filter(Teamprice.date <= i['start']).\
-            all()[-1].elo
-        away_elo = Teamprice.query.\
-            filter(Teamprice.team_id == away_tObj.id).\
-            filter(Teamprice.date <= i['start']).\
-            all()[-1].elo
+        home_elo = pregame_elo(home_tick.id, i['start'], db)
+        away_elo = pregame_elo(away_tick.id, i['start'], db)
         i_home_win_prob = 1/(1+10**((away_elo - home_elo - h)/400))
         i_away_win_prob = 1 - i_home_win_prob
         if ':' in clock:
@@ -168,7 +206,17 @@ def bigboy_pulls_only(db):
         else:
             time_elapsed = 48 + ((period - 4) * 5 - since_period)
         
-        live_prob = liveGame(time_elapsed, score_margin, i_home_win_prob * 100, period)
+        pending.append((i, home_tick, away_tick, home_elo, away_elo, i_home_win_prob))
+        live_inputs.append((time_elapsed, score_margin, i_home_win_prob * 100, period))
+    if not pending:
+        return results
+    # every live game's win probability in one call
+    live_probs = liveGames(*zip(*live_inputs)).tolist()
+    for (i, home_tick, away_tick, home_elo, away_elo, i_home_win_prob), live_prob in \
+            zip(pending, live_probs):
+        home_abv = i['home_team']
+        away_abv = i['away_team']
+        score_margin = i['score_margin']
         if score_margin > 0:
             proj_mov = score_margin * live_prob/100
         else:
@@ -178,30 +226,12 @@ def bigboy_pulls_only(db):
         
         new_homeElo = home_elo + elo_change
         new_awayElo = away_elo - elo_change
-        ps_during_game = Purchase.query.\
-            filter(Purchase.purchased_at <= today).\
-            filter(Purchase.purchased_at >= i['start'])
-        home_ps = len(ps_during_game.filter(Purchase.team_id == home_tObj.id).all())
-        away_ps = len(ps_during_game.filter(Purchase.team_id == away_tObj.id).all())
-        ss_during_game = Sale.query.\
-            filter(Sale.date <= today).\
-            filter(Sale.date >= i['start'])
-        home_ss = len(ss_during_game.filter(Sale.team_id == home_tObj.id).all())
-        away_ss = len(ss_during_game.filter(Sale.team_id == away_tObj.id).all())
-        new_homeElo *= (1.0025 ** (home_ps - home_ss))
-        new_awayElo *= (1.0025 ** (away_ps - away_ss))
-        shorts_during_game = ShortTransaction.query.\
-            filter(ShortTransaction.shorted_at <= today).\
-            filter(ShortTransaction.shorted_at >= i['start'])
-        unshorts_during_game = Unshort.query.\
-            filter(Unshort.unshorted_at <= today).\
-            filter(Unshort.unshorted_at >= i['start'])
-        home_shorts = len(shorts_during_game.filter(ShortTransaction.team_id == home_tObj.id).all())
-        away_shorts = len(shorts_during_game.filter(ShortTransaction.team_id == away_tObj.id).all())
-        home_unshorts = len(unshorts_during_game.filter(Unshort.team_id == home_tObj.id).all())
-        away_unshorts = len(unshorts_during_game.filter(Unshort.team_id == away_tObj.id).all())
-        new_homeElo *= (1.0025 ** (home_unshorts - home_shorts))
-        new_awayElo *= (1.0025 ** (away_unshorts - away_shorts))
+        new_homeElo *= (1.0025 ** flow[home_tick.id]['buy'])
+        new_awayElo *= (1.0025 ** flow[away_tick.id]['buy'])
+        new_homeElo *= (1.0025 ** flow[home_tick.id]['short'])
+        new_awayElo *= (1.0025 ** flow[away_tick.id]['short'])
+        home_tObj = db.session.query(Team).get(home_tick.id)
+        away_tObj = db.session.query(Team).get(away_tick.id)
         set_teamPrice(home_tObj, new_homeElo, today, db)
         results.append({home_abv: {'date': str(today), 'price': new_homeElo}})
         set_teamPrice(away_tObj, new_awayElo, today, db)
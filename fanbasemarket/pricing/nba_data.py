@@ -1,9 +1,8 @@
 from nba_api.stats.endpoints import leaguedashplayerstats, playbyplay, leaguegamefinder, winprobabilitypbp
 from nba_api.stats.static import teams
-from basketball_reference_web_scraper import client
-from basketball_reference_web_scraper.data import OutputType
+from fanbasemarket.pricing.schedules import season_df
+import numpy as np
 import pandas as pd
-from os import listdir, mkdir
 from csv import writer, reader
 import matplotlib.pyplot as plt
 import matplotlib.axes as ax
@@ -28,16 +27,7 @@ def get_games_on_date(date):
 # functions to pull and read CSVs 
 format_year = lambda yr: '{}-{}'.format(yr-1, str(yr)[-2:])
 def get_schedule_df(end_yr):
-
-    if 'schedules' not in listdir('.'):
-        mkdir('schedules')
-    fname = '{}-{}_schedule.csv'.format(end_yr-1, str(end_yr)[-2:])
-    path = f'schedules/{fname}'
-    if fname not in listdir('schedules'):
-        client.season_schedule(season_end_year=end_yr,
-                               output_type=OutputType.CSV,
-                               output_file_path=path)
-    return pd.read_csv(path)
+    return season_df(end_yr)
 
 def get_schedule_range_df(start_yr, end_yr):
     return [get_schedule_df(yr) for yr in range(start_yr+1, end_yr+1)]
@@ -127,7 +117,7 @@ def playbyplay_scores(game_id):
 
         if game["SCOREMARGIN"] == "TIE":
             game["SCOREMARGIN"] = 0
-        scores_list.append((time_elapsed,int(game["SCOREMARGIN"])))
+        scores_list.append((time_elapsed,int(game["SCOREMARGIN"]),int(game["PERIOD"])))
     return scores_list
 
 def removeGLeague(d):
@@ -195,6 +185,74 @@ def liveGame(time_elapsed, score_margin, initial_prob, period):
     else:
         return round(live_w/10,2)
 
+# 2**27 + 1: splits a double into two 26-bit halves
+SPLIT = 134217729.0
+
+def product_error(a, b, p):
+    '''a * b - p exactly, where p = a * b as computed (Dekker's two-product)'''
+    c = SPLIT * a
+    ah = c - (c - a)
+    al = a - ah
+    c = SPLIT * b
+    bh = c - (c - b)
+    bl = b - bh
+    return ((ah * bh - p) + ah * bl + al * bh) + al * bl
+
+def square(x):
+    '''x ** 2 as Python floats compute it: libm pow() only differs from x * x
+    when the square isn't exact, so just those elements go through pow()'''
+    sq = x * x
+    inexact = product_error(x, x, sq) != 0
+    if inexact.any():
+        sq[inexact] = [v ** 2 for v in x[inexact].tolist()]
+    return sq
+
+def round2(x):
+    '''round(x, 2) elementwise; np.round rounds x * 100, which is itself
+    rounded, so exact halves are settled with the product's error term'''
+    scaled = x * 100
+    err = product_error(x, 100.0, scaled)
+    r = np.rint(scaled)
+    off = scaled - r
+    r = np.where((off == .5) & (err > 0), r + 1, r)
+    r = np.where((off == -.5) & (err < 0), r - 1, r)
+    return r / 100
+
+def liveGames(time_elapsed, score_margin, initial_prob, period):
+    '''liveGame over arrays (broadcast together); equal to it element for element
+
+    liveGame fails once time_left is negative; so does this, with a ValueError.
+    '''
+    time_elapsed, score_margin, initial_prob, period = np.broadcast_arrays(
+        *[np.asarray(a, dtype=float) for a in
+          (time_elapsed, score_margin, initial_prob, period)])
+    time_left = np.where(period <= 4, 48 - time_elapsed,
+                         (48 + ((period - 4) * 5)) - time_elapsed)
+    if not (time_left >= 0).all():
+        raise ValueError('no win probability for a negative time_left')
+    margin = np.abs(score_margin)
+    initial_prob = np.where(score_margin < 0, 100 - initial_prob, initial_prob)
+    y_int = ( ( ( (initial_prob - 50) /47) * (time_left - 48) ) + initial_prob)*10
+    # inside 6 minutes a lead of 4+ counts 1.5x (2.5x in the last 2), capped
+    late = np.where(margin >= 4,
+                    np.minimum(margin * np.where(time_left >= 2, 1.5, 2.5), 18.974),
+                    margin)
+    sq, late_sq = square(margin), square(late)
+    live_w = np.select(
+        [time_left >= 41, time_left >= 34, time_left >= 27, time_left >= 20,
+         time_left >= 13, time_left >= 6, time_left > 0],
+        [(12.466 * margin) + y_int,
+         (15.61 * margin) + y_int,
+         (-0.4924 * sq) + (30.235 * margin) + y_int,
+         (-0.7378 * sq) + (38.449 * margin) + y_int,
+         (-0.8934 * sq) + 42.765 * margin + y_int,
+         (-1.0865 * sq) + (47.695 * margin) + y_int,
+         (-1.4237 * late_sq) + (54.695 * late) + y_int],
+        1000.0)
+    live_w = np.minimum(live_w, 999)
+    # round(score_margin, 2) < 0
+    return round2(np.where(score_margin <= -0.005, 100 - live_w/10, live_w/10))
+
 def fullGame(date, gameonday, k):
     alldata = getDateInfo(date, gameonday)
     initial_prob = alldata[2]*100
@@ -202,9 +260,13 @@ def fullGame(date, gameonday, k):
     scores = playbyplay_scores(alldata[-1])
     pct = [{"Time Remaining": 48.0, "Odds to win": initial_prob}]
     elos = [{"Time Remaining": 48.0, "Home Team": alldata[0], "Away Team": alldata[1]}]
-    for pair in scores:
+    # every play's win probability in one call
+    probs = []
+    if scores:
+        elapsed, margins, periods = zip(*scores)
+        probs = liveGames(elapsed, margins, initial_prob, periods).tolist()
+    for pair, liveprobs in zip(scores, probs):
         time_remaining = round(48 - pair[0],2)
-        liveprobs = liveGame(pair[0], pair[1],initial_prob)
         if pair[1] > 0:
             proj_mov = pair[1] * liveprobs/100
         else:
@@ -0,0 +1,96 @@
+'''On-disk schedule store shared by the elo simulators and nba_data.
+
+Each season's basketball-reference schedule is fetched at most once and
+kept as a gzip-compressed pickle in SCHEDULE_CACHE_DIR, keyed by season
+end year and CACHE_VERSION. A season that still had unplayed games when
+it was cached is refetched after STALE_AFTER. With SCHEDULE_OFFLINE set
+(or offline=True) nothing is fetched: a season that is not cached raises
+ScheduleUnavailable.
+'''
+from datetime import datetime, timedelta, timezone
+from os import getenv, makedirs, path, replace
+import gzip
+import pickle
+from basketball_reference_web_scraper import client
+from basketball_reference_web_scraper.errors import InvalidSeason
+import pandas as pd
+
+# bump when the cached layout (or the scraper's game dicts) change
+# 2: fetched_at is timezone-aware
+CACHE_VERSION = 2
+CACHE_DIR = getenv('SCHEDULE_CACHE_DIR', 'schedules')
+OFFLINE = getenv('SCHEDULE_OFFLINE', '').lower() not in ('', '0', 'false')
+STALE_AFTER = timedelta(hours=6)
+
+class ScheduleUnavailable(LookupError):
+    pass
+
+def season_label(end_yr):
+    '''the season ending in end_yr as written in file names: 2020 -> 2019-20'''
+    return f'{end_yr - 1}-{str(end_yr)[-2:]}'
+
+def cache_path(end_yr):
+    return path.join(CACHE_DIR, f'{season_label(end_yr)}.v{CACHE_VERSION}.pkl.gz')
+
+def read_cache(end_yr):
+    '''the cached entry, or None if missing, unreadable or from another version'''
+    try:
+        with gzip.open(cache_path(end_yr), 'rb') as f:
+            entry = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != CACHE_VERSION:
+        return None
+    return entry
+
+def write_cache(end_yr, games):
+    target = cache_path(end_yr)
+    makedirs(path.dirname(target) or '.', exist_ok=True)
+    entry = {'version': CACHE_VERSION, 'season_end_year': end_yr,
+             'fetched_at': datetime.now(timezone.utc),
+             'complete': all(g['home_team_score'] is not None for g in games),
+             'games': games}
+    tmp = f'{target}.tmp'
+    with gzip.open(tmp, 'wb') as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    replace(tmp, target)
+
+def season(end_yr, offline=None):
+    '''the schedule of the season ending in end_yr (basketball-reference game dicts)'''
+    offline = OFFLINE if offline is None else offline
+    entry = read_cache(end_yr)
+    if entry is not None and (offline or entry['complete'] or
+                              datetime.now(timezone.utc) - entry['fetched_at'] < STALE_AFTER):
+        return entry['games']
+    if offline:
+        raise ScheduleUnavailable(f'no cached schedule for {end_yr} (offline)')
+    games = client.season_schedule(season_end_year=end_yr)
+    write_cache(end_yr, games)
+    return games
+
+def season_items(start_yr, end_yr, offline=None):
+    '''(end year, schedule) of the seasons ending start_yr + 1 .. end_yr; seasons basketball-reference lacks are skipped'''
+    seasons = []
+    for year in range(start_yr + 1, end_yr + 1):
+        try:
+            seasons.append((year, season(year, offline)))
+        except InvalidSeason:
+            pass
+    return seasons
+
+def season_range(start_yr, end_yr, offline=None):
+    '''schedules of the seasons ending start_yr + 1 .. end_yr; seasons basketball-reference lacks are skipped'''
+    return [games for _, games in season_items(start_yr, end_yr, offline)]
+
+def season_df(end_yr, offline=None):
+    '''season() as a DataFrame with the columns of the scraper's CSV output'''
+    return pd.DataFrame([{'start_time': str(g['start_time']),
+                          'away_team': g['away_team'].value,
+                          'away_team_score': g['away_team_score'],
+                          'home_team': g['home_team'].value,
+                          'home_team_score': g['home_team_score']}
+                         for g in season(end_yr, offline)],
+                        columns=['start_time', 'away_team', 'away_team_score',
+                                 'home_team', 'home_team_score'])
@@ -0,0 +1,131 @@
+'''Scoreboard sources for the live pricing job.
+
+A source has now(), the time the pull happens at, and fetch(day), the
+day's games or None when there is nothing new to price.
+'''
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from hashlib import sha1
+from json import loads
+from threading import Lock
+from time import monotonic
+from dateutil import parser
+from pytz import timezone
+from requests import RequestException, Session
+from requests.adapters import HTTPAdapter
+
+EST = timezone('US/Eastern')
+
+URL = 'http://data.nba.net/10s/prod/v1/{}/scoreboard.json'
+
+# (connect, read) seconds; the scheduler pulls every 30s
+TIMEOUT = (3.05, 10)
+BACKOFF_BASE = 30
+BACKOFF_MAX = 600
+
+class ScoreboardClient:
+    '''Keep-alive, conditional scoreboard fetches behind a circuit breaker.
+
+    fetch() returns the day's games, or None when there is nothing new to
+    price: the server answered 304, the body hashes the same as last time,
+    or the breaker is open after recent failures.
+    '''
+
+    def __init__(self, url=URL, timeout=TIMEOUT, clock=monotonic):
+        self.url = url
+        self.timeout = timeout
+        self.clock = clock
+        self.session = Session()
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=4))
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=4))
+        self._lock = Lock()
+        self._validators = {}
+        self._digest = None
+        self.failures = 0
+        self.retry_at = 0
+
+    def now(self):
+        return datetime.now(EST)
+
+    def fetch(self, day):
+        with self._lock:
+            if self.clock() < self.retry_at:
+                return None
+            url = self.url.format(day.strftime('%Y%m%d'))
+            try:
+                r = self.session.get(url, headers=self._validators.get(url, {}),
+                                     timeout=self.timeout)
+                if r.status_code == 304:
+                    self._succeeded()
+                    return None
+                r.raise_for_status()
+                games = r.json()['games']
+            except (RequestException, ValueError, KeyError):
+                self._failed()
+                return None
+            self._succeeded()
+            self._validators[url] = {h: r.headers[v] for h, v in
+                                     [('If-None-Match', 'ETag'),
+                                      ('If-Modified-Since', 'Last-Modified')]
+                                     if v in r.headers}
+            digest = sha1(r.content).hexdigest()
+            if digest == self._digest:
+                return None
+            self._digest = digest
+            return games
+
+    def _succeeded(self):
+        self.failures = 0
+        self.retry_at = 0
+
+    def _failed(self):
+        '''opens the breaker for BACKOFF_BASE * 2^(failures - 1) seconds, capped'''
+        self.failures += 1
+        backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+        self.retry_at = self.clock() + backoff
+
+class ReplaySource:
+    '''Plays back recorded scoreboards instead of the live feed.
+
+    frames are (aware datetime, scoreboard json) pairs. Replayed time starts
+    at the first frame on the first call and runs `speed` times faster than
+    `clock`. fetch(day) serves the latest frame at or before `day`, which
+    is the replayed now(), and only once.
+    '''
+
+    def __init__(self, frames, speed=100, clock=monotonic):
+        frames = sorted(frames, key=lambda f: f[0])
+        self.times = [at for at, _ in frames]
+        self.boards = [board for _, board in frames]
+        self.speed = speed
+        self.clock = clock
+        self.started = None
+        self._served = None
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        '''reads a recording: one {"at": iso time, "scoreboard": {...}} per line'''
+        frames = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    rec = loads(line)
+                    frames.append((parser.parse(rec['at']), rec['scoreboard']))
+        return cls(frames, **kwargs)
+
+    def now(self):
+        if self.started is None:
+            self.started = self.clock()
+        elapsed = (self.clock() - self.started) * self.speed
+        return (self.times[0] + timedelta(seconds=elapsed)).astimezone(EST)
+
+    def fetch(self, day):
+        ix = bisect_right(self.times, day) - 1
+        if ix < 0 or ix == self._served:
+            return None
+        self._served = ix
+        return self.boards[ix]['games']
+
+    @property
+    def finished(self):
+        return self._served == len(self.times) - 1
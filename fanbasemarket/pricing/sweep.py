@@ -0,0 +1,134 @@
+'''Elo hyper-parameter sweep: backtests every grid point on a process pool.
+
+Each point replays the schedules with its own k, home advantage h, margin
+of victory switch and between-season reversion, predicting every game
+before updating on it. Teams start from dbsetup's STARTING_ELOS. Games of
+the --score-from season and later are scored by Brier score and log-loss;
+earlier seasons are burn-in. Injuries are not modelled (they need the
+player table).
+
+    python -m fanbasemarket.pricing.sweep --start 2014 --end 2020 \\
+        --score-from 2018-19 --k 20,30,45 --h 50,75,100 --revert .6,.75
+
+The ranked grid is written to --out as CSV.
+'''
+from argparse import ArgumentParser, ArgumentTypeError
+from concurrent.futures import ProcessPoolExecutor
+from csv import DictWriter
+from itertools import product
+from math import log
+import numpy as np
+
+from fanbasemarket.dbsetup import get_starting_elo
+from fanbasemarket.pricing.elo import proj_home_win_pct, home_rating_change
+from fanbasemarket.pricing.schedules import season_items, season_label
+from fanbasemarket.queries.registry import bbref_name
+
+MEAN = 1500
+EPS = 1e-15
+
+_games = None
+
+def compact(seasons):
+    '''(season end year, home, away, score_diff) arrays for every played game,
+    teams as indexes into 'start', their starting elos'''
+    index = {}
+    rows = []
+    for end_yr, schedule in seasons:
+        for game in schedule:
+            if game['home_team_score'] is None:
+                continue
+            home = index.setdefault(game['home_team'], len(index))
+            away = index.setdefault(game['away_team'], len(index))
+            rows.append((end_yr, home, away,
+                         int(game['home_team_score']) - int(game['away_team_score'])))
+    arr = np.array(rows, dtype=np.int64).reshape(-1, 4)
+    start = [get_starting_elo(bbref_name(team)) or MEAN for team in index]
+    return {'season': arr[:, 0], 'home': arr[:, 1], 'away': arr[:, 2],
+            'diff': arr[:, 3], 'teams': len(index),
+            'start': np.array(start, dtype=float)}
+
+def _init(games):
+    global _games
+    _games = games
+
+def backtest(params, games=None):
+    '''replays the games with one parameter set; returns its scores'''
+    games = games or _games
+    k, h, use_mov, revert, score_from = params
+    elo = games['start'].copy()
+    season = -1
+    brier = loss = 0.0
+    correct = n = 0
+    for s, home, away, diff in zip(games['season'].tolist(), games['home'].tolist(),
+                                   games['away'].tolist(), games['diff'].tolist()):
+        if s != season:
+            elo = revert * elo + (1 - revert) * MEAN
+            season = s
+        elo_diff = float(elo[home]) - float(elo[away])
+        if s >= score_from:
+            p = proj_home_win_pct(h, elo_diff)
+            won = diff > 0
+            brier += (p - won) ** 2
+            p = min(max(p, EPS), 1 - EPS)
+            loss -= log(p) if won else log(1 - p)
+            correct += (p > .5) == won
+            n += 1
+        change = home_rating_change(k, h, diff, elo_diff, use_mov)
+        elo[home] += change
+        elo[away] -= change
+    n = max(n, 1)
+    return {'k': k, 'h': h, 'use_mov': use_mov, 'revert': revert, 'games': n,
+            'brier': brier / n, 'log_loss': loss / n, 'accuracy': correct / n}
+
+def floats(s):
+    return [float(x) for x in s.split(',')]
+
+def season_end(label):
+    '''--score-from: a season label such as 2018-19, as its end year'''
+    try:
+        end_yr = int(label.partition('-')[0]) + 1
+    except ValueError:
+        end_yr = None
+    if end_yr is None or season_label(end_yr) != label:
+        raise ArgumentTypeError(f'{label!r} is not a season like 2018-19')
+    return end_yr
+
+def main():
+    ap = ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--start', type=int, default=2014)
+    ap.add_argument('--end', type=int, default=2020)
+    ap.add_argument('--score-from', type=season_end, default='2018-19',
+                    help='first season whose games are scored, e.g. 2018-19')
+    ap.add_argument('--k', type=floats, default=[20, 30, 45, 60])
+    ap.add_argument('--h', type=floats, default=[50, 75, 100])
+    ap.add_argument('--mov', choices=['on', 'off', 'both'], default='both')
+    ap.add_argument('--revert', type=floats, default=[.75])
+    ap.add_argument('--rank-by', choices=['brier', 'log_loss'], default='brier')
+    ap.add_argument('--workers', type=int, default=None)
+    ap.add_argument('--offline', action='store_true',
+                    help='only use schedules already in the schedule cache')
+    ap.add_argument('--out', default='elo_sweep.csv')
+    args = ap.parse_args()
+
+    games = compact(season_items(args.start, args.end, args.offline or None))
+    movs = {'on': [True], 'off': [False], 'both': [True, False]}[args.mov]
+    grid = list(product(args.k, args.h, movs, args.revert, [args.score_from]))
+    with ProcessPoolExecutor(args.workers, initializer=_init,
+                             initargs=(games,)) as pool:
+        results = list(pool.map(backtest, grid, chunksize=max(1, len(grid) // 32)))
+    results.sort(key=lambda r: r[args.rank_by])
+
+    with open(args.out, 'w', newline='') as f:
+        writer = DictWriter(f, fieldnames=['rank'] + list(results[0]))
+        writer.writeheader()
+        for rank, r in enumerate(results, 1):
+            writer.writerow({'rank': rank, **r})
+    print(f'{len(grid)} parameter sets over {len(games["diff"])} games -> {args.out}')
+    for rank, r in enumerate(results[:10], 1):
+        print(f"{rank:>3} k={r['k']:<6g} h={r['h']:<6g} mov={r['use_mov']!s:<5} "
+              f"revert={r['revert']:<5g} brier={r['brier']:.4f} "
+              f"log_loss={r['log_loss']:.4f} acc={r['accuracy']:.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+from collections import deque, namedtuple
+from threading import Lock
+from time import time
+
+from fanbasemarket.models import Team
+
+Tick = namedtuple('Tick', ['id', 'abr', 'price', 'prev_price', 'delta', 'date', 'seq'],
+                  defaults=[None])
+
+LOG_SIZE = 1024
+
+# sequence numbers restart with the process; clients compare epochs first
+EPOCH = int(time())
+
+_lock = Lock()
+_log = deque(maxlen=LOG_SIZE)
+_ticks = {}
+_abrs = {}
+_version = 0
+_loaded = False
+_listeners = []
+
+def subscribe(fn):
+    '''fn(old_tick, new_tick) is called after every published price change'''
+    _listeners.append(fn)
+    return fn
+
+def load(db):
+    global _version, _loaded
+    rows = db.session.query(Team.id, Team.abr, Team.price, Team.prev_price,
+                            Team.delta).all()
+    with _lock:
+        _version += 1
+        _ticks.clear()
+        _abrs.clear()
+        # a reload is not a delta of anything in the log
+        _log.clear()
+        for tid, abr, price, prev_price, delta in rows:
+            _ticks[abr] = Tick(tid, abr, price, prev_price, delta, None, _version)
+            _abrs[tid] = abr
+        _loaded = True
+
+def ensure_loaded(db):
+    if not _loaded:
+        load(db)
+
+def invalidate():
+    global _loaded
+    with _lock:
+        _loaded = False
+
+def publish(team, dt):
+    '''records the team's (a Team row or Tick) current price; call once the price write is committed'''
+    global _version
+    with _lock:
+        _version += 1
+        tick = Tick(team.id, team.abr, team.price, team.prev_price, team.delta,
+                    dt, _version)
+        old = _ticks.get(team.abr)
+        _ticks[team.abr] = tick
+        _abrs[team.id] = team.abr
+        _log.append(tick)
+    for fn in _listeners:
+        fn(old, tick)
+    return tick
+
+def get(abr, db):
+    ensure_loaded(db)
+    return _ticks.get(abr)
+
+def get_by_id(tid, db):
+    ensure_loaded(db)
+    abr = _abrs.get(tid)
+    return None if abr is None else _ticks[abr]
+
+def price(abr, db):
+    tick = get(abr, db)
+    if tick is None:
+        raise ValueError('no such team')
+    return tick.price
+
+def snapshot(db):
+    ensure_loaded(db)
+    with _lock:
+        return dict(_ticks), _version
+
+def peek():
+    '''snapshot() without loading from the db; may be empty or partial'''
+    with _lock:
+        return dict(_ticks), _version
+
+def since(seq):
+    '''ticks published after sequence `seq`, oldest first
+
+    None if the log no longer reaches back to `seq` (or `seq` is from
+    another epoch); the caller then needs a full snapshot instead.
+    '''
+    with _lock:
+        if seq == _version:
+            return []
+        if seq > _version or not _log or _log[0].seq > seq + 1:
+            return None
+        return [t for t in _log if t.seq > seq]
+
+def version():
+    return _version
+
+def is_stale(since):
+    '''True if any price was published after version `since` was read'''
+    return since != _version
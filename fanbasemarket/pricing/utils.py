@@ -1,12 +1,5 @@
-from basketball_reference_web_scraper import client
+from fanbasemarket.pricing.schedules import season_range
 
 
-def get_schedule_range(start_yr, end_yr):
-    schedules = []
-    for year in range(start_yr + 1, end_yr + 1):
-        try:
-            schedule = client.season_schedule(season_end_year=year)
-            schedules.append(schedule)
-        except:
-            pass
-    return schedules
+def get_schedule_range(start_yr, end_yr, offline=None):
+    return season_range(start_yr, end_yr, offline)
@@ -0,0 +1,110 @@
+from sqlalchemy import and_, or_
+
+from fanbasemarket.models import Teamcandle, Teamprice
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+def bucket_start(dt, resolution):
+    '''start of the candle that dt falls into, as the naive time the db stores'''
+    dt = dt.replace(tzinfo=None, second=0, microsecond=0)
+    if resolution == 'minute':
+        return dt
+    dt = dt.replace(minute=0)
+    if resolution == 'hour':
+        return dt
+    return dt.replace(hour=0)
+
+def record_candles(team_id, price, dt, db):
+    '''folds one price tick into the team's minute, hour and day candles (no commit)'''
+    for resolution in RESOLUTIONS:
+        bucket = bucket_start(dt, resolution)
+        candle = db.session.query(Teamcandle).\
+            filter(Teamcandle.team_id == team_id).\
+            filter(Teamcandle.resolution == resolution).\
+            filter(Teamcandle.bucket == bucket).\
+            first()
+        if candle is None:
+            candle = Teamcandle(team_id=team_id, resolution=resolution,
+                                bucket=bucket, open=price, high=price,
+                                low=price, close=price)
+            db.session.add(candle)
+        else:
+            candle.high = max(candle.high, price)
+            candle.low = min(candle.low, price)
+            candle.close = price
+
+def record_candles_bulk(ticks, db):
+    '''record_candles for many (team_id, price, dt) ticks, in order: one read, one bulk insert (no commit)'''
+    if not ticks:
+        return
+    earliest = min(bucket_start(dt, 'day') for _, _, dt in ticks)
+    team_ids = {tid for tid, _, _ in ticks}
+    existing = {(c.team_id, c.resolution, c.bucket): c for c in
+                db.session.query(Teamcandle).
+                    filter(Teamcandle.team_id.in_(team_ids)).
+                    filter(Teamcandle.bucket >= earliest)}
+    candles = {}
+    for tid, price, dt in ticks:
+        for resolution in RESOLUTIONS:
+            key = (tid, resolution, bucket_start(dt, resolution))
+            if key in existing:
+                candle = existing[key]
+                candle.high = max(candle.high, price)
+                candle.low = min(candle.low, price)
+                candle.close = price
+            elif key not in candles:
+                candles[key] = {'team_id': key[0], 'resolution': key[1],
+                                'bucket': key[2], 'open': price, 'high': price,
+                                'low': price, 'close': price}
+            else:
+                c = candles[key]
+                c['high'] = max(c['high'], price)
+                c['low'] = min(c['low'], price)
+                c['close'] = price
+    db.session.bulk_insert_mappings(Teamcandle, list(candles.values()))
+
+def get_recent_candles(since, db):
+    '''candles of every team, one statement, by team then bucket; since maps
+    resolution -> earliest bucket (None for all)'''
+    windows = []
+    for resolution, start in since.items():
+        if start is None:
+            windows.append(Teamcandle.resolution == resolution)
+        else:
+            windows.append(and_(Teamcandle.resolution == resolution,
+                                Teamcandle.bucket >= start.replace(tzinfo=None)))
+    # sorted here: an ORDER BY lets the planner walk the whole unique index
+    # (every minute candle) instead of ranging over ix_teamcandle_resolution_bucket
+    candles = db.session.query(Teamcandle.team_id, Teamcandle.resolution,
+                               Teamcandle.bucket, Teamcandle.open,
+                               Teamcandle.high, Teamcandle.low,
+                               Teamcandle.close).\
+        filter(or_(*windows)).\
+        all()
+    return sorted(candles, key=lambda c: (c.team_id, c.bucket))
+
+def fold_candles(ticks):
+    '''candle rows (dicts) for (team_id, date, price) ticks given in date order'''
+    candles = {}
+    for team_id, date, price in ticks:
+        for resolution in RESOLUTIONS:
+            key = (team_id, resolution, bucket_start(date, resolution))
+            if key not in candles:
+                candles[key] = {'team_id': key[0], 'resolution': key[1],
+                                'bucket': key[2], 'open': price, 'high': price,
+                                'low': price, 'close': price}
+            else:
+                c = candles[key]
+                c['high'] = max(c['high'], price)
+                c['low'] = min(c['low'], price)
+                c['close'] = price
+    return list(candles.values())
+
+def rebuild_candles(db):
+    '''recomputes every candle from the raw teamprice history (backfill)'''
+    db.session.query(Teamcandle).delete()
+    prices = db.session.query(Teamprice.team_id, Teamprice.date, Teamprice.elo).\
+        order_by(Teamprice.date, Teamprice.id).\
+        yield_per(1000)
+    db.session.bulk_insert_mappings(Teamcandle, fold_candles(prices))
+    db.session.commit()
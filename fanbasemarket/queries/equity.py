@@ -0,0 +1,51 @@
+import numpy as np
+
+TRADE_SIGNS = {'PURCHASE': 1, 'UNSHORT': 1, 'SALE': -1, 'SHORT': -1, 'PRICE': 0}
+
+def forward_fill(m):
+    '''fills each column's NaNs with the last value above them'''
+    rows = np.arange(m.shape[0])[:, None]
+    idx = np.where(np.isnan(m), 0, rows)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return m[idx, np.arange(m.shape[1])]
+
+def equity_curve(milestones, funds, holdings):
+    '''vectorized replay_milestones: same (points, funds), holdings updated in place'''
+    n = len(milestones)
+    if n == 0:
+        return [], funds
+    tids = sorted(set(m['tid'] for m in milestones) | set(holdings))
+    col = {tid: j for j, tid in enumerate(tids)}
+    cols = np.fromiter((col[m['tid']] for m in milestones), int, n)
+    sign = np.fromiter((TRADE_SIGNS[m['type']] for m in milestones), float, n)
+    amt = np.fromiter((m.get('amt', 0) for m in milestones), float, n)
+    px = np.fromiter((m['price'] if m['type'] == 'PRICE' else m['for'] \
+                      for m in milestones), float, n)
+    rows = np.arange(1, n + 1)
+    is_trade = sign != 0
+    # row 0 holds the starting state, row i the state after milestone i - 1
+    prices = np.full((n + 1, len(tids)), np.nan)
+    flow = np.zeros((n + 1, len(tids)))
+    first_trade = np.full(len(tids), n + 1)
+    for tid, (shares, price) in holdings.items():
+        prices[0, col[tid]] = price
+        flow[0, col[tid]] = shares
+        first_trade[col[tid]] = 0
+    prices[rows, cols] = px
+    flow[rows[is_trade], cols[is_trade]] = sign[is_trade] * amt[is_trade]
+    np.minimum.at(first_trade, cols[is_trade], rows[is_trade])
+    prices = forward_fill(prices)
+    positions = np.cumsum(flow, axis=0)
+    cash = np.zeros(n + 1)
+    cash[0] = funds
+    cash[rows[is_trade]] = -sign[is_trade] * amt[is_trade] * px[is_trade]
+    cash = np.cumsum(cash)
+    # teams never traded have no position, so their unfilled prices don't count
+    values = cash + np.einsum('ij,ij->i', positions, np.nan_to_num(prices))
+    marks = (sign == 0) & (first_trade[cols] < rows)
+    points = [(milestones[i - 1]['date'], float(values[i])) for i in rows[marks]]
+    for tid in tids:
+        j = col[tid]
+        if first_trade[j] <= n:
+            holdings[tid] = [int(positions[-1, j]), float(prices[-1, j])]
+    return points, float(cash[-1])
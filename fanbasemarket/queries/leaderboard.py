@@ -0,0 +1,131 @@
+from threading import Lock
+from sortedcontainers import SortedList
+from sqlalchemy import func
+
+from fanbasemarket.models import User, Purchase
+from fanbasemarket.pricing import ticker
+
+_lock = Lock()
+_ranked = SortedList()
+_users = {}
+_uids = {}
+_positions = {}
+_holders = {}
+_version = 0
+_loaded = False
+
+def _key(uid):
+    username, _, value = _users[uid]
+    return (-value, username)
+
+def _revalue(uid, funds, db):
+    value = funds
+    for tid, shares in _positions.get(uid, {}).items():
+        value += shares * ticker.get_by_id(tid, db).price
+    return value
+
+def _replace(uid, username, funds, value):
+    global _version
+    if uid in _users:
+        _ranked.remove(_key(uid))
+    _users[uid] = [username, funds, value]
+    _uids[username] = uid
+    _ranked.add(_key(uid))
+    _version += 1
+
+def load(db):
+    '''builds every user's valuation from scratch: two statements total'''
+    global _loaded, _version
+    usrs_all = db.session.query(User.id, User.username, User.available_funds).\
+        yield_per(500)
+    held = db.session.query(Purchase.user_id, Purchase.team_id,
+                            func.sum(Purchase.amt_shares)).\
+        filter(Purchase.exists == True).\
+        group_by(Purchase.user_id, Purchase.team_id).\
+        yield_per(1000)
+    positions = {}
+    for uid, tid, shares in held:
+        positions.setdefault(uid, {})[tid] = int(shares)
+    with _lock:
+        _ranked.clear()
+        _users.clear()
+        _uids.clear()
+        _holders.clear()
+        _positions.clear()
+        _positions.update(positions)
+        for uid, held_by in positions.items():
+            for tid in held_by:
+                _holders.setdefault(tid, set()).add(uid)
+        for uid, username, funds in usrs_all:
+            _users[uid] = [username, funds, _revalue(uid, funds, db)]
+            _uids[username] = uid
+            _ranked.add(_key(uid))
+        _version += 1
+        _loaded = True
+
+def ensure_loaded(db):
+    if not _loaded:
+        load(db)
+
+def invalidate():
+    global _loaded
+    with _lock:
+        _loaded = False
+
+@ticker.subscribe
+def on_price(old, new):
+    '''moves every holder of the team by shares * price change'''
+    if not _loaded or old is None:
+        return
+    delta = new.price - old.price
+    with _lock:
+        for uid in _holders.get(new.id, ()):
+            username, funds, value = _users[uid]
+            _replace(uid, username, funds,
+                     value + _positions[uid][new.id] * delta)
+
+def on_trade(uid, username, funds, team_id, shares_delta, db):
+    '''call after a trade commits, with the user's funds after it'''
+    if not _loaded:
+        return
+    with _lock:
+        held_by = _positions.setdefault(uid, {})
+        shares = held_by.get(team_id, 0) + shares_delta
+        if shares > 0:
+            held_by[team_id] = shares
+            _holders.setdefault(team_id, set()).add(uid)
+        else:
+            held_by.pop(team_id, None)
+            _holders.get(team_id, set()).discard(uid)
+        _replace(uid, username, funds, _revalue(uid, funds, db))
+
+def add_user(usr):
+    if not _loaded:
+        return
+    with _lock:
+        _replace(usr.id, usr.username, usr.available_funds, usr.available_funds)
+
+def top(db, offset=0, limit=None):
+    ensure_loaded(db)
+    stop = None if limit is None else offset + limit
+    with _lock:
+        keys = list(_ranked.islice(offset, stop))
+    return [{'rank': offset + i + 1, 'username': username, 'value': -value}
+            for i, (value, username) in enumerate(keys)]
+
+def rank_of(username, db):
+    ensure_loaded(db)
+    with _lock:
+        uid = _uids.get(username)
+        if uid is None:
+            return None
+        key = _key(uid)
+        return {'rank': _ranked.bisect_left(key) + 1, 'username': username,
+                'value': -key[0]}
+
+def size(db):
+    ensure_loaded(db)
+    return len(_ranked)
+
+def version():
+    return _version
@@ -0,0 +1,76 @@
+from threading import Event, Lock
+from time import sleep
+from flask import current_app
+import logging
+
+from fanbasemarket import app, executor, get_db
+from fanbasemarket.queries import snapshot
+from fanbasemarket.queries.user import Order, execute_orders
+
+log = logging.getLogger(__name__)
+
+_lock = Lock()
+_queues = {}
+
+def refresh_snapshot():
+    with app.app_context():
+        snapshot.refresh(get_db())
+
+class OrderTimeout(ValueError):
+    pass
+
+def submit(usr, abr, kind, num_shares, db):
+    '''queues an order on its team and returns its fill (raises ValueError if rejected)
+
+    The first order to reach an idle team waits ORDER_BATCH_WINDOW seconds,
+    then fills everything queued on that team in one transaction; the rest
+    wait for it, for at most ORDER_FILL_TIMEOUT seconds.
+    '''
+    order = Order(usr, kind, num_shares)
+    order.done = Event()
+    with _lock:
+        queue = _queues.setdefault(abr, [])
+        queue.append(order)
+        leader = len(queue) == 1
+    if leader:
+        lead(abr, db)
+    elif not order.done.wait(current_app.config['ORDER_FILL_TIMEOUT']):
+        with _lock:
+            queue = _queues.get(abr)
+            if queue is not None and order in queue:
+                queue.remove(order)
+                raise OrderTimeout('order timed out before it was filled')
+        raise OrderTimeout('order timed out while filling; '
+                           'check your positions before retrying')
+    if order.error is not None:
+        raise order.error
+    return order.result
+
+def lead(abr, db):
+    '''fills the team's queue; whatever happens, the queue is released and
+    every order in it is woken'''
+    batch = []
+    try:
+        window = current_app.config['ORDER_BATCH_WINDOW']
+        if window > 0:
+            sleep(window)
+        with _lock:
+            batch = _queues.pop(abr)
+        execute_orders(abr, batch, db)
+    except Exception as e:
+        for o in batch:
+            if o.result is None and o.error is None:
+                o.error = e
+    finally:
+        with _lock:
+            if not batch:
+                batch = _queues.pop(abr, [])
+        for o in batch:
+            if o.result is None and o.error is None:
+                o.error = OrderTimeout('order was not filled')
+            o.done.set()
+    if any(o.result is not None for o in batch):
+        try:
+            executor.submit(refresh_snapshot)
+        except Exception:
+            log.exception('scheduling the snapshot refresh failed')
@@ -1,5 +1,10 @@
+import numpy as np
+
 from fanbasemarket.models import Player
 
+ROSTER_COLUMNS = (Player.id, Player.name, Player.rating, Player.initial_mpg,
+                  Player.mpg, Player.pos1, Player.pos2, Player.is_injured)
+
 def new_injury_mins(player):
     new_mins = {}
     if player.pos2 != '':
@@ -10,4 +15,121 @@ def new_injury_mins(player):
     else:
         new_mins[player.pos1] = player.mpg * 0.65
         new_mins[player.pos1 + '2'] = player.mpg * 0.35
-    return new_mins
\ No newline at end of file
+    return new_mins
+
+class Roster:
+    '''One team's players as arrays: ratings, minutes and position masks.
+
+    Minute changes are whole-array operations; `stored` is applied to every
+    minute written, as a Float column would on the way to the db and back.
+    '''
+
+    def __init__(self, rows, stored=float):
+        ids, names, ratings, initial, mpg, pos1, pos2, injured = \
+            zip(*rows) if rows else ([],) * 8
+        self.ids = list(ids)
+        self.names = list(names)
+        self.slot = {}
+        for i, name in enumerate(self.names):
+            self.slot.setdefault(name, i)
+        self.rating = np.array(ratings, dtype=float)
+        self.initial_mpg = np.array(initial, dtype=float)
+        self.mpg = np.array(mpg, dtype=float)
+        self.pos1 = np.array(pos1, dtype=object)
+        self.pos2 = np.array(pos2, dtype=object)
+        self.injured = np.array([bool(x) for x in injured], dtype=bool)
+        self.dirty = np.zeros(len(self.ids), dtype=bool)
+        self.stored = stored
+
+    @classmethod
+    def load_all(cls, db, stored=float):
+        '''{team_id: Roster} for every team, in one query'''
+        rows = {}
+        for team_id, *row in db.session.query(Player.team_id, *ROSTER_COLUMNS).\
+                order_by(Player.id):
+            rows.setdefault(team_id, []).append(row)
+        return {tid: cls(r, stored) for tid, r in rows.items()}
+
+    @classmethod
+    def load(cls, team_id, db, stored=float):
+        rows = db.session.query(*ROSTER_COLUMNS).\
+            filter(Player.team_id == team_id).\
+            order_by(Player.id).all()
+        return cls(rows, stored)
+
+    def index(self, name):
+        if name not in self.slot:
+            raise ValueError(f'{name} is not on this roster')
+        return self.slot[name]
+
+    def store(self, mask, mpg):
+        stored = np.array([self.stored(m) for m in mpg.tolist()], dtype=float)
+        changed = mask & (stored != self.mpg)
+        self.mpg = np.where(mask, stored, self.mpg)
+        self.dirty |= changed
+
+    def bench(self, name):
+        '''marks the player injured with no minutes; returns (mpg, pos1, pos2)
+        they had, for rebalance()'''
+        i = self.index(name)
+        inj_mpg = float(self.mpg[i])
+        self.injured[i] = True
+        self.mpg[i] = 0.0
+        self.dirty[i] = True
+        return inj_mpg, self.pos1[i], self.pos2[i]
+
+    def rebalance(self, inj_mpg, p1, p2):
+        '''hands an injured player's minutes to healthy players by position'''
+        active = ~self.injured
+        mpg = self.mpg
+        if p2 != '':
+            share = self.rating / self.rating.sum()
+            for mask, weight in ((self.pos1 == p1, .4225), (self.pos2 == p1, .2275),
+                                 (self.pos1 == p2, .2275), (self.pos2 == p2, .1225)):
+                mpg = mpg + np.where(mask, share * (inj_mpg * weight), 0.0)
+        else:
+            mpg = np.where(self.pos1 == p1, inj_mpg * .65, mpg)
+            mpg = np.where(self.pos2 == p1, inj_mpg * .35, mpg)
+        mpg = np.minimum(mpg, 35.5)
+        self.store(active, mpg)
+
+    def injure(self, name):
+        '''benches the player and hands their minutes to teammates by position'''
+        self.rebalance(*self.bench(name))
+
+    def position_mask(self, p1, p2):
+        return (self.pos1 == p1) | (self.pos2 == p1) | (self.pos1 == p2) | (self.pos2 == p2)
+
+    def restore(self, name):
+        '''gives just this player their initial minutes back'''
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[self.index(name)] = True
+        self.store(mask, self.initial_mpg)
+
+    def restore_positions(self, p1, p2):
+        '''gives everyone playing p1 or p2 their initial minutes back'''
+        self.store(self.position_mask(p1, p2), self.initial_mpg)
+
+    def recover(self, name):
+        '''gives the player and everyone sharing a position their initial minutes back'''
+        i = self.index(name)
+        mask = self.position_mask(self.pos1[i], self.pos2[i])
+        mask[i] = True
+        self.store(mask, self.initial_mpg)
+
+    def strength(self):
+        '''sum(rating * mpg) over healthy players, summed in roster order'''
+        active = ~self.injured
+        return sum((self.rating[active] * self.mpg[active]).tolist())
+
+    def minutes(self):
+        return [(self.names[i], float(self.mpg[i]))
+                for i in np.flatnonzero(~self.injured)]
+
+    def save(self, db):
+        '''one bulk update of the players changed since the last save (no commit)'''
+        db.session.bulk_update_mappings(Player, [
+            {'id': self.ids[i], 'mpg': float(self.mpg[i]),
+             'is_injured': bool(self.injured[i])}
+            for i in np.flatnonzero(self.dirty)])
+        self.dirty[:] = False
@@ -0,0 +1,94 @@
+from collections import namedtuple
+from string import capwords
+from threading import Lock
+from basketball_reference_web_scraper.data import Team as BbrefTeam
+from nba_api.stats.static import teams
+
+from fanbasemarket.models import Team
+from fanbasemarket.pricing import ticker
+
+TeamRef = namedtuple('TeamRef', ['id', 'abr', 'name', 'nickname', 'bbref'])
+
+_lock = Lock()
+_by_id = {}
+_by_name = {}
+_by_nickname = {}
+_by_bbref = {}
+_containing = {}
+_loaded = False
+# bumped whenever the teams may have changed; see version()
+_version = 0
+
+def bbref_name(member):
+    '''full team name for a basketball_reference_web_scraper Team member'''
+    return capwords(member.name.replace('_', ' '))
+
+def load(db):
+    '''maps every team in the db to its nba_api nickname and bbref enum member'''
+    global _loaded
+    rows = db.session.query(Team.id, Team.abr, Team.name).order_by(Team.id).all()
+    nicknames = {t['abbreviation']: t['nickname'] for t in teams.get_teams()}
+    members = {bbref_name(m): m for m in BbrefTeam}
+    with _lock:
+        for index in (_by_id, _by_name, _by_nickname, _by_bbref, _containing):
+            index.clear()
+        for tid, abr, name in rows:
+            ref = TeamRef(tid, abr, name, nicknames.get(abr), members.get(name))
+            _by_id[tid] = ref
+            _by_name.setdefault(name, ref)
+            if ref.nickname is not None:
+                _by_nickname[ref.nickname] = ref
+            if ref.bbref is not None:
+                _by_bbref[ref.bbref] = ref
+        _loaded = True
+
+def ensure_loaded(db):
+    if not _loaded:
+        load(db)
+
+def invalidate():
+    '''call after adding, renaming or deleting teams'''
+    global _loaded, _version
+    with _lock:
+        _loaded = False
+        _version += 1
+
+def version():
+    '''changes with every invalidate(); the next load reflects the new teams'''
+    return _version
+
+def by_id(tid, db):
+    ensure_loaded(db)
+    return _by_id.get(tid)
+
+def by_abr(abr, db):
+    '''resolved through the ticker, which already indexes teams by abr'''
+    tick = ticker.get(abr, db)
+    return None if tick is None else by_id(tick.id, db)
+
+def by_name(name, db):
+    ensure_loaded(db)
+    return _by_name.get(name)
+
+def by_nickname(nickname, db):
+    ensure_loaded(db)
+    return _by_nickname.get(nickname)
+
+def by_bbref(member, db):
+    ensure_loaded(db)
+    return _by_bbref.get(member)
+
+def containing(fragment, db):
+    '''first team (by id) whose name contains fragment, ignoring case as
+    Team.name.contains (a MySQL LIKE) did'''
+    ensure_loaded(db)
+    fragment = fragment.casefold()
+    with _lock:
+        if fragment not in _containing:
+            _containing[fragment] = next(
+                (ref for ref in _by_id.values() if fragment in ref.name.casefold()), None)
+        return _containing[fragment]
+
+def all_teams(db):
+    ensure_loaded(db)
+    return list(_by_id.values())
@@ -0,0 +1,42 @@
+from collections import namedtuple
+from threading import Lock
+
+from fanbasemarket.encoding import encode, compress_body
+from fanbasemarket.pricing import ticker
+from fanbasemarket.queries.team import get_all_team_data, graph_bucket
+
+ENCODINGS = ['br', 'gzip']
+
+Snapshot = namedtuple('Snapshot', ['version', 'bodies'])
+
+_lock = Lock()
+_current = None
+
+def key():
+    '''what the snapshot has to be built from: the latest tick and, since the
+    1D/1W/1M windows and the 24h fallback move with the clock, the graph bucket'''
+    return (ticker.version(), graph_bucket())
+
+def rebuild(db):
+    '''encodes and compresses allTeamData once; readers get the bytes as-is'''
+    global _current
+    built_for = key()
+    raw = encode(get_all_team_data(db))
+    bodies = {e: compress_body(raw, e) for e in ENCODINGS}
+    bodies['identity'] = raw
+    _current = Snapshot(built_for, bodies)
+    return _current
+
+def refresh(db):
+    '''rebuilds unless the snapshot is already current'''
+    with _lock:
+        if _current is not None and _current.version == key():
+            return _current
+        return rebuild(db)
+
+def get(db):
+    '''the current snapshot, rebuilt first if a tick or the clock has moved on'''
+    current = _current
+    if current is not None and current.version == key():
+        return current
+    return refresh(db)
@@ -1,44 +1,105 @@
-from sqlalchemy import desc
+from sqlalchemy import desc, func
 
 from sqlalchemy.ext.declarative import declarative_base
 from fanbasemarket.models import Teamprice, Player, Purchase, Team, \
-                                 Short
+                                 Short, Portfoliocheckpoint, Portfoliosnapshot
+from fanbasemarket.queries.candle import get_recent_candles, record_candles
+from fanbasemarket.pricing import ticker
 
 from datetime import datetime, timedelta
+from time import time
 from pytz import timezone
 
 EST = timezone('US/Eastern')
 
+# portfolio history older than this is checkpointed (see generate_user_graph)
+CHECKPOINT_LAG = timedelta(minutes=5)
+
+GRAPH_WINDOWS = {
+    'SZN': ('day', None),
+    '1M': ('hour', timedelta(weeks=4)),
+    '1W': ('hour', timedelta(weeks=1)),
+    '1D': ('minute', timedelta(hours=24))
+}
+
+# seconds; a cached windowed payload is rebuilt at least this often, so its
+# 'now' and window starts lag the clock by at most GRAPH_STEP
+GRAPH_STEP = 60
+
+def graph_bucket():
+    return int(time() // GRAPH_STEP)
+
+def candle_point(candle):
+    return {'date': str(candle.bucket), 'price': candle.close,
+            'open': candle.open, 'high': candle.high, 'low': candle.low}
+
 def get_all_team_data(db):
     payload = {}
-    all_teams = db.session.query(Team).all()
+    all_teams = db.session.query(Team.id, Team.name, Team.abr, Team.price).all()
     now = datetime.now(EST)
-    for team in all_teams:
+    starts = {w: None if span is None else now - span \
+              for w, (_, span) in GRAPH_WINDOWS.items()}
+    since = {}
+    for window, (resolution, _) in GRAPH_WINDOWS.items():
+        if resolution not in since or starts[window] is None:
+            since[resolution] = starts[window]
+        elif since[resolution] is not None:
+            since[resolution] = min(since[resolution], starts[window])
+    graphs = {tid: {w: [] for w in GRAPH_WINDOWS} for tid, _, _, _ in all_teams}
+    for candle in get_recent_candles(since, db):
+        if candle.team_id not in graphs:
+            continue
+        point = None
+        for window, (resolution, _) in GRAPH_WINDOWS.items():
+            start = starts[window]
+            if candle.resolution != resolution:
+                continue
+            if start is not None and candle.bucket < start.replace(tzinfo=None):
+                continue
+            if point is None:
+                point = candle_point(candle)
+            graphs[candle.team_id][window].append(point)
+    for tid, name, abr, price in all_teams:
         d = {}
-        d['name'] = team.name
-        d['price'] = {'date': str(now), 'price': team.price}
-        prev_prices = db.session.query(Teamprice).\
-            filter(Teamprice.team_id == team.id).all()
-        d['graph'] = {}
-        d['graph']['SZN'] = [{'date': str(price.date), 'price': price.elo} \
-                             for price in prev_prices]
-        d['graph']['1M'] = [{'date': str(price.date), 'price': price.elo} \
-                            for price in prev_prices if \
-                            EST.localize(price.date) + timedelta(weeks=4) >= now]
-        d['graph']['1W'] = [{'date': str(price.date), 'price': price.elo} \
-                            for price in prev_prices if \
-                            EST.localize(price.date) + timedelta(weeks=1) >= now]
-        d['graph']['1D'] = [{'date': str(price.date), 'price': price.elo} \
-                            for price in prev_prices if \
-                            EST.localize(price.date) + timedelta(hours=24) >= now]
+        d['name'] = name
+        d['price'] = {'date': str(now), 'price': price}
+        d['graph'] = graphs[tid]
         d['graph']['1D'].append(d['price'])
         if len(d['graph']['1D']) == 1:
             dt = str(now - timedelta(hours=24))
             p = d['price']['price']
             d['graph']['1D'].append({'date': dt, 'price': p})
-        payload[team.abr] = d
+        payload[abr] = d
     return payload
 
+def invalidate_checkpoints(since, db):
+    '''drops the portfolio checkpoints (and snapshots) of every user checkpointed
+    at or after since, so their next graph replays prices dated before it (no commit)'''
+    since = since.replace(tzinfo=None)
+    uids = [uid for uid, in db.session.query(Portfoliocheckpoint.user_id).
+            filter(Portfoliocheckpoint.date >= since)]
+    if uids:
+        for model in (Portfoliosnapshot, Portfoliocheckpoint):
+            db.session.query(model).filter(model.user_id.in_(uids)).\
+                delete(synchronize_session=False)
+
+def backfilled(dt, db):
+    '''called for every price row written: live ticks are dated now, so only a
+    row older than CHECKPOINT_LAG can land behind a checkpoint'''
+    if dt.replace(tzinfo=None) <= (datetime.now(EST) - CHECKPOINT_LAG).replace(tzinfo=None):
+        invalidate_checkpoints(dt, db)
+
+def stage_teamPrice(team, delta, dt, db):
+    '''update_teamPrice for a row already in db.session: no merge, no commit, no publish'''
+    newprice = team.price + delta
+    team.prev_price = team.price
+    team.price = newprice
+    team.delta = delta
+    price_obj = Teamprice(date=dt, team_id=team.id, elo=newprice)
+    db.session.add(price_obj)
+    record_candles(team.id, newprice, dt, db)
+    backfilled(dt, db)
+
 def update_teamPrice(team, delta, dt, db):
     newprice = team.price + delta
     team.prev_price = team.price
@@ -49,7 +110,10 @@ def update_teamPrice(team, delta, dt, db):
     db.session.commit()
     price_obj = Teamprice(date=dt, team_id=team.id, elo=newprice)
     db.session.add(price_obj)
+    record_candles(team.id, newprice, dt, db)
+    backfilled(dt, db)
     db.session.commit()
+    ticker.publish(team, dt)
 
 def set_teamPrice(team, p, dt, db):
     team.prev_price = team.price
@@ -60,7 +124,10 @@ def set_teamPrice(team, p, dt, db):
     db.session.commit()
     price_obj = Teamprice(date=dt, team_id=team.id, elo=p)
     db.session.add(price_obj)
+    record_candles(team.id, p, dt, db)
+    backfilled(dt, db)
     db.session.commit()
+    ticker.publish(team, dt)
 
 def set_player_rating(team, db):
     players = db.session.query(Player).filter(Player.team_id==team.id).all()
@@ -72,33 +139,29 @@ def active_player_rating(team, db):
         all()
     return sum([player.rating * player.mpg for player in active_ps])
 
-from fanbasemarket.queries.user import get_active_holdings
-
 def get_user_position(team, user, db):
-    holdings = db.session.query(Purchase).\
+    positions = db.session.query(Purchase.team_id,
+                                 func.sum(Purchase.amt_shares),
+                                 func.avg(Purchase.purchased_for)).\
         filter(Purchase.user_id == user.id).\
-        filter(Purchase.team_id == team.id).\
         filter(Purchase.exists == True).\
+        group_by(Purchase.team_id).\
         all()
-    shorts = db.session.query(Short).\
+    short_count, num_shorted, shorted_for = db.session.query(
+            func.count(Short.id), func.sum(Short.amt_shorted),
+            func.avg(Short.shorted_for)).\
         filter(Short.user_id == user.id).\
         filter(Short.team_id == team.id).\
         filter(Short.exists == True).\
-        all()
-    values = [h.purchased_for for h in holdings]
-    if len(values) > 0:
-        bought_at = sum(values) / len(values)
-    else: 
-        bought_at = 0
-    num_shares = sum([h.amt_shares for h in holdings])
-    date = str(datetime.now(EST))
-    all_holdings = get_active_holdings(user.id, db, date=date)
+        one()
+    bought_at = 0
+    num_shares = 0
     total_val = 0
-    for abr, purchases in all_holdings.items():
-        tm = db.session.query(Team).\
-            filter(Team.abr == abr).first()
-        for purchase in purchases:
-            total_val += tm.price * purchase['num_shares']
+    for tid, shares, avg_for in positions:
+        if tid == team.id:
+            bought_at = float(avg_for)
+            num_shares = int(shares)
+        total_val += ticker.get_by_id(tid, db).price * int(shares)
     if total_val != 0:
         weight = team.price * num_shares / total_val
     else:
@@ -108,14 +171,7 @@ def get_user_position(team, user, db):
     d['num_shares'] = num_shares
     d['weight'] = weight
     d['short'] = {}
-    shorted_for = 0
-    values = [s.shorted_for for s in shorts]
-    if len(values) > 0:    
-        shorted_for = sum(values) / len(values)
-    else:
-        shorted_for = 0
-    num_shorted = sum([s.amt_shorted for s in shorts])
-    if len(values) != 0:
-        d['short']['num_shorted'] = num_shorted
-        d['short']['shorted_for'] = shorted_for
+    if short_count != 0:
+        d['short']['num_shorted'] = int(num_shorted)
+        d['short']['shorted_for'] = float(shorted_for)
     return d
@@ -1,36 +1,41 @@
 from datetime import datetime, timedelta
-from json import dumps
-from functools import reduce
-from sqlalchemy import and_, not_
+from json import dumps, loads
+import logging
+from sqlalchemy.exc import IntegrityError, OperationalError
 from pytz import timezone
-from flask_socketio import emit
 
 from fanbasemarket.models import Purchase, User, Team, Sale, PurchaseTransaction, Teamprice, \
-                                 Short, ShortTransaction, Unshort
+                                 Short, ShortTransaction, Unshort, Portfoliosnapshot, \
+                                 Portfoliocheckpoint
 
 EST = timezone('US/Eastern')
 
+log = logging.getLogger(__name__)
+
 def get_active_holdings(uid, db, date=None):
     if not date:
         date = str(datetime.now(EST))
-    results = db.session.query(Purchase).\
+    results = db.session.query(Team.abr, Purchase.purchased_at,
+                               Purchase.purchased_for, Purchase.amt_shares).\
+        join(Team, Team.id == Purchase.team_id).\
         filter(Purchase.user_id == uid).\
         filter(Purchase.exists == True).\
-        all()
+        order_by(Purchase.id).\
+        yield_per(500)
     holdings = {}
-    for result in results:
-        tm = db.session.query(Team).filter(Team.id == result.team_id).first()
-        bt_at = str(result.purchased_at)
-        bt_f = result.purchased_for
-        amt_shares = result.amt_shares
+    for abr, purchased_at, bt_f, amt_shares in results:
+        bt_at = str(purchased_at)
         res = {'bought_at': bt_at, 'bought_for': bt_f, 'num_shares': amt_shares}
-        if tm.abr not in holdings:
-            holdings[tm.abr] = [res]
+        if abr not in holdings:
+            holdings[abr] = [res]
         else:
-            holdings[tm.abr].append(res)
+            holdings[abr].append(res)
     return holdings
 
-from fanbasemarket.queries.team import update_teamPrice
+from fanbasemarket.queries.team import stage_teamPrice, CHECKPOINT_LAG
+from fanbasemarket.pricing import ticker
+from fanbasemarket.queries import leaderboard
+from fanbasemarket.queries.equity import equity_curve
 
 def prev_prchs(uid, end, prev_ps, prev_ss, start=None):
     if start is None:
@@ -41,41 +46,50 @@ def prev_prchs(uid, end, prev_ps, prev_ss, start=None):
         new_s = [s for s in prev_ss if EST.localize(s.date) <= end and EST.localize(s.date) > start]
     return new_p, new_s
 
-def get_leaderboard(db):
-    usrs_all = db.session.query(User).all()
-    res = []
-    for usr in usrs_all:
-        holdings = get_active_holdings(usr.id, db)
-        total = usr.available_funds
-        for abr, item in holdings.items():
-            for p in item:
-                t = db.session.query(Team).filter(Team.abr == abr).first()
-                total += p['num_shares'] * t.price
-        res.append({'username': usr.username, 'value': total})
-    return res
+def get_leaderboard(db, offset=0, limit=None):
+    return leaderboard.top(db, offset=offset, limit=limit)
 
-def generate_user_graph(uid, db):
-    now = datetime.now(EST)
+def get_user_rank(username, db):
+    return leaderboard.rank_of(username, db)
+
+def load_milestones(uid, since, db, until=None):
+    '''the user's trades and every team price after `since` and up to `until`
+    (naive, None for unbounded), in replay order'''
     milestones = []
     sales = db.session.query(Sale).\
-        filter(Sale.user_id == uid).all()
-    milestones += [{'type': 'SALE', 'tid': s.team_id, 'date': EST.localize(s.date), 'amt': s.amt_sold, 'for': s.sold_for} for s in sales]
+        filter(Sale.user_id == uid)
     ps = db.session.query(PurchaseTransaction).\
-        filter(PurchaseTransaction.user_id == uid).all()
-    milestones += [{'type': 'PURCHASE', 'tid': p.team_id, 'date': EST.localize(p.date), 'amt': p.amt_purchased, 'for': p.purchased_for} for p in ps]
+        filter(PurchaseTransaction.user_id == uid)
     shorts = db.session.query(ShortTransaction).\
-        filter(ShortTransaction.user_id == uid).all()
-    milestones += [{'type': 'SHORT', 'tid': p.team_id, 'date': EST.localize(p.shorted_at), 'amt': p.amt_shorted, 'for': p.shorted_for} for p in shorts]
+        filter(ShortTransaction.user_id == uid)
     unshorts = db.session.query(Unshort).\
-        filter(Unshort.user_id == uid).all()
+        filter(Unshort.user_id == uid)
+    prices = db.session.query(Teamprice.team_id, Teamprice.date, Teamprice.elo).\
+        join(Team, Team.id == Teamprice.team_id)
+    if since is not None:
+        sales = sales.filter(Sale.date > since)
+        ps = ps.filter(PurchaseTransaction.date > since)
+        shorts = shorts.filter(ShortTransaction.shorted_at > since)
+        unshorts = unshorts.filter(Unshort.unshorted_at > since)
+        prices = prices.filter(Teamprice.date > since)
+    if until is not None:
+        sales = sales.filter(Sale.date <= until)
+        ps = ps.filter(PurchaseTransaction.date <= until)
+        shorts = shorts.filter(ShortTransaction.shorted_at <= until)
+        unshorts = unshorts.filter(Unshort.unshorted_at <= until)
+        prices = prices.filter(Teamprice.date <= until)
+    milestones += [{'type': 'SALE', 'tid': s.team_id, 'date': EST.localize(s.date), 'amt': s.amt_sold, 'for': s.sold_for} for s in sales]
+    milestones += [{'type': 'PURCHASE', 'tid': p.team_id, 'date': EST.localize(p.date), 'amt': p.amt_purchased, 'for': p.purchased_for} for p in ps]
+    milestones += [{'type': 'SHORT', 'tid': p.team_id, 'date': EST.localize(p.shorted_at), 'amt': p.amt_shorted, 'for': p.shorted_for} for p in shorts]
     milestones += [{'type': 'UNSHORT', 'tid': p.team_id, 'date': EST.localize(p.unshorted_at), 'amt': p.amt_unshorted, 'for': p.unshorted_for} for p in unshorts]
-    for team in db.session.query(Team).all():
-        prices = db.session.query(Teamprice).filter(Teamprice.team_id == team.id).all()
-        milestones += [{'type': 'PRICE', 'tid': team.id, 'date': EST.localize(p.date), 'price': p.elo} for p in prices]
-    milestones = sorted(milestones, key=lambda x: x['date'])
+    prices = prices.order_by(Teamprice.team_id, Teamprice.id).yield_per(5000)
+    milestones += [{'type': 'PRICE', 'tid': tid, 'date': EST.localize(date), 'price': elo} for tid, date, elo in prices]
+    return sorted(milestones, key=lambda x: x['date'])
+
+def replay_milestones(milestones, funds, holdings):
+    '''scalar reference for equity.equity_curve: replays milestones on top of
+    (funds, holdings), mutating holdings; returns (points, funds)'''
     points = []
-    holdings = {}
-    funds = 50000.0
     for milestone in milestones:
         tid = milestone['tid']
         if (milestone['type'] == 'PURCHASE' or milestone['type'] == 'UNSHORT'):
@@ -97,6 +111,79 @@ def generate_user_graph(uid, db):
                 for _, val in holdings.items():
                     assets += val[0] * val[1]
                 points.append((milestone['date'], assets))
+    return points, funds
+
+def read_checkpoint(uid, db, lock=False):
+    query = db.session.query(Portfoliocheckpoint).\
+        filter(Portfoliocheckpoint.user_id == uid)
+    if lock:
+        query = query.with_for_update()
+    return query.first()
+
+def checkpoint_state(checkpoint):
+    '''(since, funds, holdings) to replay from; since is None before anything is settled'''
+    holdings = {int(tid): val for tid, val in loads(checkpoint.holdings).items()}
+    return checkpoint.date, checkpoint.funds, holdings
+
+def ensure_checkpoint(uid, db):
+    '''creates the user's checkpoint row, with nothing settled, if it is missing'''
+    if read_checkpoint(uid, db) is not None:
+        return
+    db.session.add(Portfoliocheckpoint(user_id=uid, date=None, funds=50000.0,
+                                       holdings=dumps({})))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another request created it first
+        db.session.rollback()
+
+def settle_portfolio(uid, cut, db):
+    '''moves the user's checkpoint up to cut (naive), storing a snapshot per
+    price replayed on the way; returns the checkpoint
+
+    Concurrent graph requests for one user serialize on the checkpoint row,
+    which trades never lock, and re-check it under the lock, so each
+    milestone is snapshotted once and a long replay holds up no orders.
+    '''
+    ensure_checkpoint(uid, db)
+    # the lock and the reads after it need a fresh transaction to see the latest rows
+    db.session.commit()
+    checkpoint = read_checkpoint(uid, db, lock=True)
+    if checkpoint is None:
+        # dropped by invalidate_checkpoints in the meantime
+        db.session.commit()
+        return settle_portfolio(uid, cut, db)
+    since, funds, holdings = checkpoint_state(checkpoint)
+    if since is not None and since >= cut:
+        db.session.commit()
+        return checkpoint
+    new_points, funds = equity_curve(load_milestones(uid, since, db, until=cut),
+                                     funds, holdings)
+    checkpoint.date = cut
+    checkpoint.funds = funds
+    checkpoint.holdings = dumps(holdings)
+    db.session.bulk_insert_mappings(Portfoliosnapshot, [
+        {'user_id': uid, 'date': date.replace(tzinfo=None), 'value': value}
+        for date, value in new_points])
+    db.session.commit()
+    return checkpoint
+
+def generate_user_graph(uid, db):
+    now = datetime.now(EST)
+    # anything older than the lag is assumed settled and gets checkpointed
+    cut = (now - CHECKPOINT_LAG).replace(tzinfo=None)
+    checkpoint = read_checkpoint(uid, db)
+    if checkpoint is None or checkpoint.date is None or cut > checkpoint.date:
+        checkpoint = settle_portfolio(uid, cut, db)
+    since, funds, holdings = checkpoint_state(checkpoint)
+    recent = load_milestones(uid, since, db)
+    recent_points, _ = equity_curve(recent, funds, holdings)
+    stored = db.session.query(Portfoliosnapshot.date, Portfoliosnapshot.value).\
+        filter(Portfoliosnapshot.user_id == uid).\
+        order_by(Portfoliosnapshot.date, Portfoliosnapshot.id).\
+        yield_per(5000)
+    points = [(EST.localize(date), value) for date, value in stored]
+    points += recent_points
     graph = {}
     graph['1D'] = [{'date': str(point[0]), 'price': point[1]} for point in points if \
                    point[0] + timedelta(hours=24) >= now]
@@ -107,132 +194,254 @@ def generate_user_graph(uid, db):
     graph['SZN'] = [{'date': str(point[0]), 'price': point[1]} for point in points]
     return graph
 
-def buy_shares(usr, abr, num_shares, db):
-    team = db.session.query(Team).filter(Team.abr == abr).first()
-    price = num_shares * team.price * 1.0025
-    if usr.available_funds < price:
+def lock_team(abr, db):
+    tick = ticker.get(abr, db)
+    if tick is None:
+        raise ValueError('no such team')
+    return db.session.query(Team).\
+        filter(Team.id == tick.id).\
+        with_for_update().\
+        one()
+
+def lock_funds(uid, db):
+    return db.session.query(User.available_funds).\
+        filter(User.id == uid).\
+        with_for_update().\
+        scalar()
+
+def move_funds(uid, amount, db):
+    '''adds amount (negative to debit) unless that would overdraw; True if applied'''
+    q = db.session.query(User).filter(User.id == uid)
+    if amount < 0:
+        q = q.filter(User.available_funds >= -amount)
+    n = q.update({User.available_funds: User.available_funds + amount},
+                 synchronize_session=False)
+    return n == 1
+
+def consume_lots(model, amt_col, lots, num_shares, closed_values, db):
+    '''takes num_shares out of (id, amt) lots, largest first, in at most two UPDATEs'''
+    lots = sorted(lots, key=lambda lot: lot[1], reverse=True)
+    closed = []
+    left = num_shares
+    for lot_id, amt in lots:
+        if left == 0:
+            break
+        if amt <= left:
+            closed.append(lot_id)
+            left -= amt
+        else:
+            db.session.query(model).\
+                filter(model.id == lot_id).\
+                update({amt_col: amt - left}, synchronize_session=False)
+            left = 0
+    if closed:
+        db.session.query(model).\
+            filter(model.id.in_(closed)).\
+            update(closed_values, synchronize_session=False)
+
+def fill_buy(uid, team, fill, num_shares, now, db):
+    funds = lock_funds(uid, db)
+    price = num_shares * fill
+    if not move_funds(uid, -price, db):
         raise ValueError('not enough funds')
-    now = datetime.now(EST)
-    purchase = Purchase(team_id=team.id, user_id=usr.id, purchased_at=now,
-                        purchased_for=team.price * 1.0025, amt_shares=num_shares)
-    db.session.add(purchase)
-    db.session.commit()
-    ptransac = PurchaseTransaction(team_id=team.id, user_id=usr.id, date=now,
-                                  purchased_for=team.price * 1.0025, amt_purchased=num_shares)
-    db.session.add(ptransac)
-    db.session.commit()
-    res = [{team.abr: {'date': str(now), 'price': team.price * 1.0025}}]
-    emit('prices', res, broadcast=True, namespace='/')
-    update_teamPrice(team, (team.price * .0025), now , db)
-    usr.available_funds -= price
-    loc = db.session.merge(usr)
-    db.session.add(loc)
-    db.session.commit()
-    return res
+    db.session.add(Purchase(team_id=team.id, user_id=uid, purchased_at=now,
+                            purchased_for=fill, amt_shares=num_shares))
+    db.session.add(PurchaseTransaction(team_id=team.id, user_id=uid, date=now,
+                                       purchased_for=fill, amt_purchased=num_shares))
+    return funds - price, num_shares
 
-def sell_shares(usr, abr, num_shares, db):
-    team = db.session.query(Team).filter(Team.abr == abr).first()
-    price = num_shares * team.price * .9975
-    all_holdings = db.session.query(Purchase).filter(Purchase.user_id == usr.id).filter(Purchase.team_id == team.id).filter(Purchase.exists == True).all()
-    total_shares = reduce(lambda x, p: x + p.amt_shares, all_holdings, 0)
-    if num_shares > total_shares:
+def fill_sell(uid, team, fill, num_shares, now, db):
+    funds = lock_funds(uid, db)
+    price = num_shares * fill
+    lots = db.session.query(Purchase.id, Purchase.amt_shares).\
+        filter(Purchase.user_id == uid).\
+        filter(Purchase.team_id == team.id).\
+        filter(Purchase.exists == True).\
+        with_for_update().\
+        all()
+    if num_shares > sum(amt for _, amt in lots):
         raise ValueError('not enough shares owned')
-    now = datetime.now(EST)
-    all_holdings.sort(key=lambda p: p.amt_shares, reverse=True)
-    left_to_delete = num_shares
-    ix = 0
-    while left_to_delete > 0:
-        p = all_holdings[ix]
-        to_del = min(p.amt_shares, left_to_delete)
-        if to_del == p.amt_shares:
-            p.exists = False
-            p.sold_at = now
-            p.sold_for = team.price * .9975
-        else:
-            p.amt_shares -= to_del
-        loc = db.session.merge(p)
-        db.session.add(loc)
-        db.session.commit()
-        left_to_delete -= to_del
-        ix += 1
-    usr.available_funds += price
-    loc_u = db.session.merge(usr)
-    db.session.add(loc_u)
-    db.session.commit()
-    new_sale = Sale(team_id=team.id, date=now, amt_sold=num_shares, user_id=usr.id,
-                    sold_for=team.price * .9975)
-    db.session.add(new_sale)
-    db.session.commit()
-    res = [{team.abr: {'date': str(now), 'price': team.price * .9975}}]
-    emit('prices', res, broadcast=True, namespace='/')
-    update_teamPrice(team, -(team.price * .0025), now, db)
-    return res
+    consume_lots(Purchase, Purchase.amt_shares, lots, num_shares,
+                 {Purchase.exists: False, Purchase.sold_at: now,
+                  Purchase.sold_for: fill}, db)
+    move_funds(uid, price, db)
+    db.session.add(Sale(team_id=team.id, date=now, amt_sold=num_shares,
+                        user_id=uid, sold_for=fill))
+    return funds + price, -num_shares
 
-def short_team(usr, abr, num_shares, db):
-    now = datetime.now(EST)
-    tm = db.session.query(Team).\
-        filter(Team.abr == abr).first()
-    price = num_shares * tm.price * .9975
-    usr.available_funds += price
-    short = Short(team_id=tm.id, user_id=usr.id, shorted_for=tm.price * .9975,
-                  shorted_at=now, amt_shorted=num_shares)
-    db.session.add(short)
-    db.session.commit()
-    transac = ShortTransaction(team_id=tm.id, user_id=usr.id,
-                               shorted_for=tm.price * .9975,
-                               shorted_at=now, amt_shorted=num_shares)
-    db.session.add(transac)
-    db.session.commit()
-    loc_usr = db.session.merge(usr)
-    db.session.add(loc_usr)
-    db.session.commit()
-    res = [{tm.abr: {'date': str(now), 'price': tm.price * .9975}}]
-    emit('prices', res, broadcast=True, namespace='/')
-    update_teamPrice(tm, -(tm.price * .0025), now , db)
-    return res
+def fill_short(uid, team, fill, num_shares, now, db):
+    funds = lock_funds(uid, db)
+    price = num_shares * fill
+    move_funds(uid, price, db)
+    db.session.add(Short(team_id=team.id, user_id=uid, shorted_for=fill,
+                         shorted_at=now, amt_shorted=num_shares))
+    db.session.add(ShortTransaction(team_id=team.id, user_id=uid,
+                                    shorted_for=fill, shorted_at=now,
+                                    amt_shorted=num_shares))
+    return funds + price, 0
 
-def unshort_team(usr, abr, num_shares, db):
-    team = db.session.query(Team).\
-        filter(Team.abr == abr).\
-        first()
-    price = num_shares * team.price * 1.0025
-    if price > usr.available_funds:
+def fill_unshort(uid, team, fill, num_shares, now, db):
+    funds = lock_funds(uid, db)
+    price = num_shares * fill
+    if not move_funds(uid, -price, db):
         raise ValueError('insufficient funds')
-    all_shorts = db.session.query(Short).\
-        filter(Short.user_id == usr.id).\
+    lots = db.session.query(Short.id, Short.amt_shorted).\
+        filter(Short.user_id == uid).\
         filter(Short.team_id == team.id).\
         filter(Short.exists == True).\
+        with_for_update().\
         all()
-    total_shares = reduce(lambda x, p: x + p.amt_shorted, all_shorts, 0)
-    if num_shares > total_shares:
+    if num_shares > sum(amt for _, amt in lots):
         raise ValueError('not enough shares owned')
-    now = datetime.now(EST)
-    all_holdings.sort(key=lambda p: p.amt_shares, reverse=True)
-    left_to_delete = num_shares
-    ix = 0
-    while left_to_delete > 0:
-        p = all_shorts[ix]
-        to_del = min(p.amt_shorted, left_to_delete)
-        if to_del == p.amt_shorted:
-            p.exists = False
-            p.unshorted_at = now
-            p.unshorted_for = team.price * 1.0025
-        else:
-            p.amt_shorted -= to_del
-        loc = db.session.merge(p)
-        db.session.add(loc)
+    consume_lots(Short, Short.amt_shorted, lots, num_shares,
+                 {Short.exists: False, Short.unshorted_at: now,
+                  Short.unshorted_for: fill}, db)
+    db.session.add(Unshort(team_id=team.id, unshorted_at=now,
+                           amt_unshorted=num_shares, user_id=uid,
+                           unshorted_for=fill))
+    return funds - price, 0
+
+# kind -> (fill function, fill price as a multiple of the team price,
+#          direction the order pushes the price)
+ORDER_KINDS = {
+    'BUY': (fill_buy, 1.0025, 1),
+    'SELL': (fill_sell, .9975, -1),
+    'SHORT': (fill_short, .9975, -1),
+    'UNSHORT': (fill_unshort, 1.0025, 1)
+}
+
+class Order:
+    def __init__(self, usr, kind, num_shares):
+        if kind not in ORDER_KINDS:
+            raise ValueError('unknown order type')
+        self.uid = usr.id
+        self.username = usr.username
+        self.kind = kind
+        self.num_shares = num_shares
+        self.result = None
+        self.error = None
+
+def net_flow_multiplier(net):
+    '''price multiple for `net` orders pushing up (negative: down), as if filled one by one'''
+    return 1.0025 ** net if net >= 0 else .9975 ** -net
+
+# MySQL's ER_LOCK_DEADLOCK: InnoDB rolled the transaction back to break a cycle
+DEADLOCK = 1213
+
+class OrderConflict(ValueError):
+    pass
+
+def is_deadlock(e):
+    args = getattr(e.orig, 'args', None)
+    return bool(args) and args[0] == DEADLOCK
+
+def execute_orders(abr, orders, db):
+    '''fills orders on one team in one transaction and moves the price once
+    by their net flow; sets .result or .error (ValueError) on each order
+
+    A batch chosen as a deadlock victim is retried once from scratch.
+    '''
+    for attempt in range(2):
+        try:
+            fills = fill_orders(abr, orders, db)
+            break
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_deadlock(e):
+                raise
+            for order in orders:
+                order.error = None
+            if attempt:
+                for order in orders:
+                    order.error = OrderConflict('the market was busy; please retry')
+                return
+    if fills is None:
+        return
+    tick, now, filled = fills
+    for order, fill, _, _ in filled:
+        order.result = [{tick.abr: {'date': str(now), 'price': fill}}]
+    after_fills(tick, now, filled, db)
+
+def fill_orders(abr, orders, db):
+    '''one attempt at execute_orders: returns (tick, now, filled) once
+    committed, or None if nothing filled
+
+    User rows are locked in uid order, so batches on different teams that
+    share users cannot deadlock on them.
+    '''
+    try:
+        team = lock_team(abr, db)
+        now = datetime.now(EST)
+        price = team.price
+        filled = []
+        net = 0
+        # stable: one user's orders keep their queue order
+        for order in sorted(orders, key=lambda o: o.uid):
+            fill_fn, fee, direction = ORDER_KINDS[order.kind]
+            fill = price * fee
+            savepoint = db.session.begin_nested()
+            try:
+                funds, shares_delta = fill_fn(order.uid, team, fill,
+                                              order.num_shares, now, db)
+                savepoint.commit()
+            except ValueError as e:
+                savepoint.rollback()
+                order.error = e
+                continue
+            net += direction
+            filled.append((order, fill, funds, shares_delta))
+        if not filled:
+            db.session.rollback()
+            return None
+        stage_teamPrice(team, price * net_flow_multiplier(net) - price, now, db)
+        # read the row before commit expires it
+        tick = ticker.Tick(team.id, team.abr, team.price, team.prev_price,
+                           team.delta, now)
         db.session.commit()
-        left_to_delete -= to_del
-        ix += 1
-    usr.available_funds -= price
-    loc_u = db.session.merge(usr)
-    db.session.add(loc_u)
-    db.session.commit()
-    new_unshort = Unshort(team_id=team.id, unshorted_at=now, amt_unshorted=num_shares,
-                          user_id=usr.id, unshorted_for=team.price * 1.0025)
-    db.session.add(new_unshort)
-    db.session.commit()
-    res = [{team.abr: {'date': str(now), 'price': team.price * 1.0025}}]
-    emit('prices', res, broadcast=True, namespace='/')
-    update_teamPrice(team, team.price * .0025, now, db)
-    return res
+    except ValueError as e:
+        db.session.rollback()
+        for order in orders:
+            order.error = e
+        return None
+    except Exception:
+        db.session.rollback()
+        raise
+    return tick, now, filled
+
+def after_fills(tick, now, filled, db):
+    '''updates the in-memory ticker and leaderboard once fills are committed
+
+    The trades stand whatever happens here, so a failing hook is logged and
+    its cache dropped (it reloads from the db) instead of failing the orders.
+    '''
+    try:
+        ticker.publish(tick, now)
+    except Exception:
+        log.exception('publishing the %s tick failed', tick.abr)
+        ticker.invalidate()
+    for order, _, funds, shares_delta in filled:
+        try:
+            leaderboard.on_trade(order.uid, order.username, funds, tick.id,
+                                 shares_delta, db)
+        except Exception:
+            log.exception('leaderboard update for %s failed', order.username)
+            leaderboard.invalidate()
+
+def execute_order(usr, abr, kind, num_shares, db):
+    order = Order(usr, kind, num_shares)
+    execute_orders(abr, [order], db)
+    if order.error is not None:
+        raise order.error
+    return order.result
+
+def buy_shares(usr, abr, num_shares, db):
+    return execute_order(usr, abr, 'BUY', num_shares, db)
+
+def sell_shares(usr, abr, num_shares, db):
+    return execute_order(usr, abr, 'SELL', num_shares, db)
+
+def short_team(usr, abr, num_shares, db):
+    return execute_order(usr, abr, 'SHORT', num_shares, db)
+
+def unshort_team(usr, abr, num_shares, db):
+    return execute_order(usr, abr, 'UNSHORT', num_shares, db)
@@ -5,6 +5,7 @@ from flask_jwt_extended import (
 )
 from fanbasemarket.models import User, BlacklistedToken
 from fanbasemarket.routes.utils import bad_request, ok
+from fanbasemarket.queries import leaderboard
 from fanbasemarket import app, jwt, get_db
 from flask import Blueprint, request
 from flask_cors import cross_origin, CORS
@@ -42,6 +43,7 @@ def create_user():
                     password=pwrd)
             db.session.add(u)
             db.session.commit()
+            leaderboard.add_user(u)
             access_jwt = create_access_token(identity=uname)
             refresh_jwt = create_refresh_token(identity=uname)
             resp = ok({'access_token': access_jwt, 'refresh_token': refresh_jwt, 'username': uname})
@@ -1,9 +1,11 @@
 from flask import Blueprint, request
 from flask_cors import CORS, cross_origin
 from fanbasemarket import app, get_db
-from fanbasemarket.models import Team, User
-from fanbasemarket.routes.utils import ok, bad_request
-from fanbasemarket.queries.team import get_user_position, get_all_team_data
+from fanbasemarket.models import User
+from fanbasemarket.routes.utils import ok, bad_request, conditional, precompressed
+from fanbasemarket.queries.team import get_user_position
+from fanbasemarket.queries import registry, snapshot
+from fanbasemarket.pricing import ticker
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from pytz import timezone
 from datetime import datetime
@@ -20,19 +22,20 @@ def creds(response):
 
 @teams.route('allTeamData', methods=['GET'])
 @cross_origin('*')
+@conditional(lambda: (ticker.EPOCH, snapshot.key()))
 def all_team_data():
     with app.app_context():
         db = get_db()
-        return ok(get_all_team_data(db))
+        return precompressed(snapshot.get(db).bodies)
 
 @teams.route('teamNames', methods=['GET'])
 @cross_origin('*')
+@conditional(lambda: (ticker.EPOCH, registry.version()))
 def names():
     with app.app_context():
         db = get_db()
-        teams_all = Team.query.all()
         payload = {}
-        for team in teams_all:
+        for team in registry.all_teams(db):
             payload[team.abr] = team.name
         return ok(payload)
 
@@ -45,5 +48,7 @@ def get_pos():
     with app.app_context():
         db = get_db()
         usr = User.query.filter(User.username == uname).first()
-        tm = Team.query.filter(Team.abr == js['Abr']).first()
+        tm = ticker.get(js['Abr'], db)
+        if tm is None:
+            return bad_request('no such team')
         return ok(get_user_position(tm, usr, db))
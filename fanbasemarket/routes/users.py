@@ -5,12 +5,14 @@ from datetime import datetime
 from pytz import timezone
 
 from fanbasemarket import app, get_db
-from fanbasemarket.models import Purchase, User, Teamprice, Team
+from fanbasemarket.models import Purchase, User, Teamprice
 from fanbasemarket.queries.user import get_active_holdings, get_leaderboard, \
-                                       generate_user_graph, short_team, \
-                                       unshort_team
-from fanbasemarket.routes.utils import bad_request, ok
-from fanbasemarket.queries.user import buy_shares, sell_shares
+                                       generate_user_graph, get_user_rank
+from fanbasemarket.queries.orders import submit as submit_order
+from fanbasemarket.queries.team import graph_bucket
+from fanbasemarket.routes.utils import bad_request, ok, conditional
+from fanbasemarket.pricing import ticker
+from fanbasemarket.queries import leaderboard as ranking
 
 EST = timezone('US/Eastern')
 
@@ -25,13 +27,36 @@ def creds(response):
 
 @users.route('/leaderboard', methods=['GET'])
 @cross_origin('*')
+@conditional(lambda: (ticker.EPOCH, ticker.version(), ranking.version()))
 def leaderboard():
     with app.app_context():
         db = get_db()
-        return ok(get_leaderboard(db))
+        if 'page' not in request.args:
+            return ok(get_leaderboard(db))
+        try:
+            page = int(request.args['page'])
+            per_page = int(request.args.get('per_page', 50))
+        except ValueError:
+            return bad_request('page and per_page must be integers')
+        if page < 1 or per_page < 1:
+            return bad_request('page and per_page must be positive')
+        return ok(get_leaderboard(db, offset=(page - 1) * per_page,
+                                  limit=per_page))
+
+@users.route('/leaderboard/rank', methods=['GET'])
+@cross_origin('*')
+def leaderboard_rank():
+    with app.app_context():
+        db = get_db()
+        uname = request.args.get('username')
+        res = get_user_rank(uname, db)
+        if res is None:
+            return bad_request('no such user')
+        return ok(res)
 
 @users.route('/usrPg', methods=['GET'])
 @cross_origin('*')
+@conditional(lambda: (ticker.EPOCH, ticker.version(), graph_bucket()), 'username', 'date')
 def gen_usrPg():
     with app.app_context():
         db = get_db()
@@ -51,9 +76,9 @@ def gen_usrPg():
         payload['holdings'] = all_purchases
         total = user_obj.available_funds
         for abr, item in all_purchases.items():
+            price = ticker.price(abr, db)
             for p in item:
-                t = Team.query.filter(Team.abr == abr).first()
-                total += p['num_shares'] * t.price
+                total += p['num_shares'] * price
         payload['total_assets'] = total
         payload['graphData'] = generate_user_graph(uid, db)
         for k in payload['graphData'].keys():
@@ -70,7 +95,7 @@ def make_purchase():
         usr = User.query.filter(User.username == uname).first()
         js = request.get_json()
         try:
-            res = buy_shares(usr, js['abr'], int(js['num_shares']), db)
+            res = submit_order(usr, js['abr'], 'BUY', int(js['num_shares']), db)
             return ok(res)
         except ValueError as e:
             return bad_request(str(e))
@@ -85,7 +110,7 @@ def make_sale():
         usr = User.query.filter(User.username == uname).first()
         js = request.get_json()
         try:
-            res = sell_shares(usr, js['abr'], int(js['num_shares']), db)
+            res = submit_order(usr, js['abr'], 'SELL', int(js['num_shares']), db)
             return ok(res)
         except ValueError as e:
             return bad_request(str(e))
@@ -100,7 +125,7 @@ def make_short():
         usr = User.query.filter(User.username == uname).first()
         js = request.get_json()
         try:
-            res = short_team(usr, js['abr'], int(js['num_shares']), db)
+            res = submit_order(usr, js['abr'], 'SHORT', int(js['num_shares']), db)
             return ok(res)
         except ValueError as e:
             return bad_request(str(e))
@@ -115,7 +140,7 @@ def make_unshort():
         usr = User.query.filter(User.username == uname).first()
         js = request.get_json()
         try:
-            res = unshort_team(usr, js['abr'], int(js['num_shares']), db)
+            res = submit_order(usr, js['abr'], 'UNSHORT', int(js['num_shares']), db)
             return ok(res)
         except ValueError as e:
             return bad_request(str(e))
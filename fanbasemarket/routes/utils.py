@@ -1,14 +1,78 @@
-from flask import Response
-from json import dumps
+from functools import wraps
+from hashlib import sha1
+from flask import Response, current_app, request
+
+from fanbasemarket.encoding import STREAM_THRESHOLD, encode, iter_encode, \
+    compress_body, iter_compress
 
 def bad_request(msg):
-    r = Response(dumps({'message': msg}))
+    r = Response(encode({'message': msg}))
     r.status_code = 400
     return r
 
 
-def ok(dict_payload, created=False):
-    payload = dumps(dict_payload)
-    r = Response(payload)
+def ok(dict_payload, created=False, stream=None):
+    '''stream=None streams only payloads with more than STREAM_THRESHOLD entries'''
+    if stream is None:
+        stream = isinstance(dict_payload, (dict, list)) and \
+                 len(dict_payload) > STREAM_THRESHOLD
+    if stream:
+        r = Response(iter_encode(dict_payload))
+    else:
+        r = Response(encode(dict_payload))
     r.status_code = 201 if created else 200
     return r
+
+def etag(*parts):
+    return sha1(repr(parts).encode()).hexdigest()
+
+def conditional(version, *headers):
+    '''answers If-None-Match with 304 while version() is unchanged
+
+    version() must not touch the database; the tag also covers the query
+    string and the given request headers.
+    '''
+    def wrap(view):
+        @wraps(view)
+        def inner(*args, **kwargs):
+            tag = etag(request.full_path, version(),
+                       *(request.headers.get(h) for h in headers))
+            if request.if_none_match.contains_weak(tag):
+                r = Response(status=304)
+            else:
+                r = view(*args, **kwargs)
+                if r.status_code != 200:
+                    return r
+            r.set_etag(tag, weak=True)
+            return r
+        return inner
+    return wrap
+
+def precompressed(bodies):
+    '''serves pre-encoded bytes, {encoding: body} including 'identity', as-is'''
+    encoding = request.accept_encodings.best_match(
+        [e for e in bodies if e != 'identity']) or 'identity'
+    r = Response(bodies[encoding])
+    if encoding != 'identity':
+        r.headers['Content-Encoding'] = encoding
+    r.vary.add('Accept-Encoding')
+    return r
+
+def compress(response):
+    '''after_request hook: br/gzip bodies over COMPRESS_MIN_SIZE (streams always)'''
+    if response.status_code not in (200, 201) or \
+       'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(['br', 'gzip'])
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = iter_compress(response.response, encoding)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,42 @@
+"""hot filter indexes
+
+Revision ID: 5d7a9e3c2b14
+Revises: 8c2e4d6f1a90
+Create Date: 2026-10-18 11:38:52.406177
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7a9e3c2b14'
+down_revision = '8c2e4d6f1a90'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_purchase_user_team_exists', 'purchase', ['user_id', 'team_id', 'exists', 'amt_shares']),
+    ('ix_purchase_team_purchased_at', 'purchase', ['team_id', 'purchased_at']),
+    ('ix_teamprice_team_date', 'teamprice', ['team_id', 'date', 'elo']),
+    ('ix_sale_team_date', 'sale', ['team_id', 'date']),
+    ('ix_sale_user_date', 'sale', ['user_id', 'date']),
+    ('ix_purchasetransaction_user_date', 'purchasetransaction', ['user_id', 'date']),
+    ('ix_short_user_team_exists', 'short', ['user_id', 'team_id', 'exists']),
+    ('ix_shorttransaction_team_shorted_at', 'shorttransaction', ['team_id', 'shorted_at']),
+    ('ix_shorttransaction_user_shorted_at', 'shorttransaction', ['user_id', 'shorted_at']),
+    ('ix_unshort_team_unshorted_at', 'unshort', ['team_id', 'unshorted_at']),
+    ('ix_unshort_user_unshorted_at', 'unshort', ['user_id', 'unshorted_at']),
+    ('ix_portfoliosnapshot_user_date', 'portfoliosnapshot', ['user_id', 'date']),
+    ('ix_teamcandle_resolution_bucket', 'teamcandle', ['resolution', 'bucket']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)